@@ -1,18 +1,30 @@
-from flask import Flask, json, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import logging
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+import time
+from threading import Lock
+from flask_jwt_extended import JWTManager
 from blueprints.blueprint_util import setup_blueprint
 from blueprints.users import users_bp
 from blueprints.groups import groups_bp
 from blueprints.expenses import expenses_bp
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from model import Base, Expense
+from flask.globals import app_ctx
+from sqlalchemy.orm import scoped_session, sessionmaker
 import os
 
 from util.sensitive_info import SensitiveSanitizer
+from util.request_logging import PayloadLogPipeline
+from util.json_provider import create_json_provider
+from util.balances import rebuild_balances
+from util.settle import SettleCache
+from util.cache import SnapshotCache
+from util.pubsub import create_broker
+from util.db import create_db_engine, pool_status
+from util.metrics import RequestMetrics
+from util.passwords import PasswordHasher
+from util.query_plans import check_query_plans
+import click
 
 # Initialize logging
 logging.basicConfig(
@@ -23,62 +35,201 @@ logging.basicConfig(
     ]
 )
 
-app = Flask(__name__)
-
 # Get blueprints to set up
 BLUEPRINTS = [users_bp, groups_bp, expenses_bp]
 
-# Get the environment variables
-app.logger.info("Loading environment variables...")
-
-load_dotenv()
-
-DATABASE_URL = os.getenv('DATABASE_URL')
-
-if not DATABASE_URL:
-    app.logger.error("DATABASE_URL not set in environment variables.")
-    raise ValueError("DATABASE_URL must be set in the environment variables.")
-
-app.logger.info("Successfully loaded environment variables.")
-
-# Set up CORS
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
-app.logger.info("CORS configured successfully.")
-
-# Initialize sensitive sanitizer
-app.logger.info("Initializing SensitiveSanitizer...")
-app.sanitizer = SensitiveSanitizer(app.logger, sensitive_fields=['password', 'access_token'])
-app.logger.info("SensitiveSanitizer initialized successfully.")
-
-# Initialize the database
-app.logger.info("Initializing database...")
-
-app.engine = create_engine(DATABASE_URL, echo=False)
-#Base.metadata.drop_all(app.engine, checkfirst=True)
-Base.metadata.create_all(app.engine)
-app.Session = sessionmaker(bind=app.engine)
-
-app.logger.info("Database initialized successfully.")
-
-# Set up JWT
-app.config["JWT_SECRET_KEY"] = "your-secret-key"
-jwt = JWTManager(app)
-
-# Define heartbeat endpoint
-@app.route('/heartbeat', methods=['GET'])
-def test_endpoint():
-    app.logger.info("Heartbeat - Healthy.")
-    return jsonify({"status": "Healthy"})
-
-# Register blueprints
-with app.app_context():
-    app.logger.info("Registering blueprints...")
-
-    for blueprint in BLUEPRINTS:
-        setup_blueprint(app, blueprint)
-
-    app.logger.info("Blueprints registered successfully.")
+class SplititApp(Flask):
+    # The engine and session factory are created on first use rather than at startup,
+    # so forking workers or importing the app never touches the database
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.settings = {}
+        self._engine = None
+        self._session = None
+        self._db_lock = Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._db_lock:
+                if self._engine is None:
+                    start = time.perf_counter()
+                    self._engine = create_db_engine(self.config['DATABASE_URL'], self.settings)
+                    self.metrics.instrument(self._engine)
+                    self.logger.info(f"Database engine created in {(time.perf_counter() - start) * 1000:.1f} ms.")
+        return self._engine
+
+    # One session per application context (i.e. per request), removed on teardown so
+    # handlers never have to close it themselves
+    @property
+    def Session(self):
+        if self._session is None:
+            engine = self.engine
+            with self._db_lock:
+                if self._session is None:
+                    self._session = scoped_session(
+                        sessionmaker(bind=engine), scopefunc=lambda: id(app_ctx._get_current_object())
+                    )
+        return self._session
+
+# config overrides the environment, e.g. create_app({"DATABASE_URL": "sqlite://"})
+def create_app(config=None):
+    start = time.perf_counter()
+
+    app = SplititApp(__name__)
+
+    # Get the environment variables
+    app.logger.info("Loading environment variables...")
+
+    load_dotenv()
+    app.settings = {**os.environ, **(config or {})}
+
+    if not app.settings.get('DATABASE_URL'):
+        app.logger.error("DATABASE_URL not set in environment variables.")
+        raise ValueError("DATABASE_URL must be set in the environment variables.")
+
+    app.config.update(
+        DATABASE_URL=app.settings['DATABASE_URL'],
+        JWT_SECRET_KEY=app.settings.get('JWT_SECRET_KEY', "your-secret-key")
+    )
+    app.config.update(config or {})
+
+    app.logger.info("Successfully loaded environment variables.")
+
+    # Responses are encoded by the configured JSON backend (JSON_BACKEND=orjson|stdlib)
+    app.json = create_json_provider(app, app.settings.get('JSON_BACKEND'))
+    app.logger.info(f"JSON backend: {type(app.json).__name__}")
+
+    # Set up CORS
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+    app.logger.info("CORS configured successfully.")
+
+    # Initialize sensitive sanitizer
+    app.logger.info("Initializing SensitiveSanitizer...")
+    app.sanitizer = SensitiveSanitizer(app.logger, sensitive_fields=['password', 'access_token'])
+    app.logger.info("SensitiveSanitizer initialized successfully.")
+
+    # Request/response payload logging runs off the request thread
+    app.payload_log = PayloadLogPipeline.from_env(app.sanitizer, app.settings)
+    app.payload_log.start()
+    app.logger.info("Payload logging pipeline started.")
+
+    # Password hashing runs in a bounded process pool off the request threads
+    app.password_hasher = PasswordHasher.from_env(app.settings)
+    app.logger.info(f"Password hasher: {app.password_hasher.method}, {app.password_hasher.workers} worker(s), "
+                    f"queue limit {app.password_hasher.max_pending}")
+
+    # Settle-up results are memoized per group and invalidated by expense writes
+    app.settle_cache = SettleCache()
+
+    # Serialized group snapshots and expense listings, invalidated by group writes
+    app.snapshot_cache = SnapshotCache.from_env(app.settings, app.json.dumps, app.json.loads)
+    app.logger.info(f"Snapshot cache: {app.snapshot_cache.max_entries} entries, {app.snapshot_cache.ttl}s TTL.")
+
+    # Group change events for GET /groups/stream, published by the write handlers after commit
+    app.events = create_broker(app.settings, app.json.dumps, app.json.loads)
+    app.logger.info(f"Event broker: {type(app.events).__name__}")
+
+    # Per-route latency, SQL and response size metrics for GET /metrics; SLOW_REQUEST_SECONDS
+    # also logs the statements of requests slower than that
+    app.metrics = RequestMetrics.from_env(app.settings, app.logger)
+
+    @app.before_request
+    def start_request_metrics():
+        app.metrics.start_request()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        return app.metrics.finish_request(request, response)
+
+    # The schema is managed by Alembic (alembic upgrade head); the engine connects on first use
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        if app._session is not None:
+            app._session.remove()
+
+    # Set up JWT
+    JWTManager(app)
+
+    # Define heartbeat endpoint
+    @app.route('/heartbeat', methods=['GET'])
+    def test_endpoint():
+        app.logger.info("Heartbeat - Healthy.")
+        return jsonify({"status": "Healthy"})
+
+    # Connection pool usage, for sizing the pool against the number of workers, cache hit rates and startup time
+    @app.route('/stats', methods=['GET'])
+    def stats_endpoint():
+        return jsonify({
+            "startup_seconds": app.startup_seconds,
+            "pool": pool_status(app.engine),
+            "snapshot_cache": app.snapshot_cache.stats(),
+            "events": app.events.stats()
+        })
+
+    # Request metrics in the Prometheus text format, plus connection pool gauges
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        pool = pool_status(app.engine)
+        gauges = {
+            f"splitit_db_pool_{key}": (f"Connection pool {key.replace('_', ' ')}.", pool[key])
+            for key in ('size', 'checked_out', 'overflow', 'saturation') if key in pool
+        }
+        return Response(app.metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+    # Recompute the balance ledger from raw splits, reporting any drift
+    @app.cli.command('rebuild-balances')
+    @click.option('--group-id', type=int, default=None, help="Only rebuild this group's balances.")
+    @click.option('--check', is_flag=True, help="Report drift without rewriting the ledger.")
+    def rebuild_balances_command(group_id, check):
+        drift = rebuild_balances(app.Session(), group_id=group_id, check_only=check)
+
+        for entry in drift:
+            app.logger.warning(f"Balance drift in group {entry['group_id']} for user {entry['user_id']}: "
+                               f"expected {entry['expected']}, found {entry['actual']}")
+
+        app.logger.info(f"Balance ledger {'checked' if check else 'rebuilt'}: {len(drift)} drifted row(s).")
+
+        if check and drift:
+            raise SystemExit(1)
+
+    # EXPLAIN every hot query against a seeded, rolled-back dataset; fails on full table scans
+    @app.cli.command('check-query-plans')
+    @click.option('--users', type=int, default=500, help="Users to seed.")
+    @click.option('--groups', type=int, default=100, help="Groups to seed.")
+    @click.option('--expenses-per-group', type=int, default=100, help="Expenses to seed per group.")
+    @click.option('--verbose', is_flag=True, help="Print every plan, not just failures.")
+    def check_query_plans_command(users, groups, expenses_per_group, verbose):
+        results = check_query_plans(app, users=users, groups=groups, expenses_per_group=expenses_per_group)
+        failures = [result for result in results if result['seq_scans']]
+
+        for result in results:
+            if verbose or result['seq_scans']:
+                status = f"FULL SCAN on {', '.join(result['seq_scans'])}" if result['seq_scans'] else "ok"
+                click.echo(f"{result['query']}: {status}\n  {' '.join(result['statement'].split())}")
+                if verbose:
+                    click.echo(f"  {result['plan']}")
+
+        click.echo(f"{len(results)} queries checked, {len(failures)} with full table scans.")
+
+        if failures:
+            raise SystemExit(1)
+
+    # Register blueprints
+    with app.app_context():
+        app.logger.info("Registering blueprints...")
+
+        for blueprint in BLUEPRINTS:
+            setup_blueprint(app, blueprint)
+
+        app.logger.info("Blueprints registered successfully.")
+
+    # Cold-start cost of building the app, reported under /stats
+    app.startup_seconds = time.perf_counter() - start
+    app.logger.info(f"Application created in {app.startup_seconds * 1000:.1f} ms.")
+
+    return app
 
 # Run the Flask application
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
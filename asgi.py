@@ -0,0 +1,482 @@
+import asyncio
+import json
+from collections import namedtuple
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import create_access_token, decode_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from werkzeug.http import parse_etags, quote_etag
+
+from app import create_app
+from blueprints.users import username_prefix_search
+from model import Group, User
+from util.balances import BALANCE_TOLERANCE, user_balances
+from util.db import create_async_db_engine
+from util.dto import expense_page
+from util.group_versions import etag_for, user_group_versions
+from util.loader_profiles import GROUP_HEADER, GROUP_SNAPSHOT
+from util.pagination import InvalidCursor, DEFAULT_LIMIT, MAX_LIMIT, paginate
+from util.passwords import HasherOverloaded
+from util.pubsub import group_channel
+from util.sync import changes_since, decode_sync_token
+
+# ASGI deployment mode: uvicorn asgi:app
+#
+# The hot read endpoints, the user lookups and login, and the group event stream run as
+# coroutines on an AsyncEngine, so one worker keeps many database round trips in flight
+# instead of holding a thread per request. Every other route, and any query shape these
+# handlers do not cover (fields/depth projections, writes), falls through to the Flask
+# app on a2wsgi's thread pool (ASGI_FALLBACK_WORKERS threads, default 10). The sync
+# helpers are reused through AsyncSession.run_sync, which drives them on the async driver.
+# Native routes get the same CORS headers, /metrics accounting and payload logging as
+# their Flask counterparts.
+
+flask_app = create_app()
+flask_app.async_engine = create_async_db_engine(flask_app.config['DATABASE_URL'], flask_app.settings)
+flask_app.AsyncSession = async_sessionmaker(flask_app.async_engine, expire_on_commit=False)
+flask_app.metrics.instrument(flask_app.async_engine.sync_engine)
+
+def json_response(payload, status_code=200, headers=None):
+    return Response(flask_app.json.dumps(payload), status_code=status_code, headers=headers, media_type='application/json')
+
+def int_arg(request, name):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+def get_limit(request):
+    limit = int_arg(request, 'limit')
+    return max(1, min(limit if limit is not None else DEFAULT_LIMIT, MAX_LIMIT))
+
+# Same key as request.full_path in Flask, so both modes share snapshot cache entries
+def full_path(request):
+    return f"{request.scope['path']}?{request.scope['query_string'].decode('latin-1')}"
+
+# Parsed JSON body, or None when it is not JSON. The raw body is kept on request.state
+# so a handler that hands the request to Flask does not lose it.
+async def json_body(request):
+    request.state.body = await request.body()
+
+    if not request.headers.get('content-type', '').startswith('application/json'):
+        return None
+    try:
+        return json.loads(request.state.body)
+    except ValueError:
+        return None
+
+# Identity of a valid bearer token, or None; Flask answers missing and invalid tokens
+def jwt_identity(request):
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme != 'Bearer' or not token:
+        return None
+
+    try:
+        with flask_app.app_context():
+            return decode_token(token)[flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub')]
+    except Exception:
+        return None
+
+def conditional(request, *parts):
+    etag = etag_for(request.scope['path'], request.scope['query_string'], *parts)
+
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        return etag, Response(status_code=304, headers={"ETag": quote_etag(etag)})
+    return etag, None
+
+async def heartbeat(request):
+    return json_response({"status": "Healthy"})
+
+async def get_group(request):
+    group_id = int_arg(request, 'group_id')
+    if group_id is None or any(name in request.query_params for name in ('fields', 'depth')):
+        return None
+
+    try:
+        async with flask_app.AsyncSession() as session:
+            version = await session.scalar(select(Group.version).where(Group.id == group_id))
+            if version is None:
+                return json_response({"message": "Group not found"}, 404)
+
+            etag, unchanged = conditional(request, group_id, version)
+            if unchanged:
+                return unchanged
+
+            variant = full_path(request)
+            group_dict = flask_app.snapshot_cache.get(group_id, variant, version)
+            if group_dict is None:
+                def load(sync_session):
+                    group = sync_session.query(Group).options(*GROUP_SNAPSHOT).filter_by(id=group_id).first()
+                    return group.to_dict() if group is not None else None
+
+                group_dict = await session.run_sync(load)
+                if group_dict is None:
+                    return json_response({"message": "Group not found"}, 404)
+                flask_app.snapshot_cache.set(group_id, variant, version, group_dict)
+    except Exception as e:
+        flask_app.logger.error(f"Error fetching group: {e}")
+        return json_response({"message": "Failed to fetch group", "error": f"{e}"}, 500)
+
+    return json_response({"groups": [group_dict]}, headers={"ETag": quote_etag(etag)})
+
+async def get_expenses(request):
+    group_id = int_arg(request, 'group_id')
+    if group_id is None or any(name in request.query_params for name in ('fields', 'depth')):
+        return None
+
+    cursor = request.query_params.get('cursor')
+    limit = get_limit(request)
+
+    try:
+        async with flask_app.AsyncSession() as session:
+            version = await session.scalar(select(Group.version).where(Group.id == group_id))
+            if version is None:
+                return json_response({"message": "Group not found"}, 404)
+
+            etag, unchanged = conditional(request, group_id, version)
+            if unchanged:
+                return unchanged
+
+            variant = full_path(request)
+            payload = flask_app.snapshot_cache.get(group_id, variant, version)
+            if payload is None:
+                def load(sync_session):
+                    group = sync_session.query(Group).options(*GROUP_HEADER).filter_by(id=group_id).first()
+                    if group is None:
+                        return None
+
+                    expenses_list, next_cursor = expense_page(sync_session, group, cursor, limit)
+                    return {"group": group.to_dict(include_expenses=False), "expenses": expenses_list, "next_cursor": next_cursor}
+
+                payload = await session.run_sync(load)
+                if payload is None:
+                    return json_response({"message": "Group not found"}, 404)
+                flask_app.snapshot_cache.set(group_id, variant, version, payload)
+    except InvalidCursor:
+        return json_response({"message": "Invalid cursor"}, 400)
+    except Exception as e:
+        flask_app.logger.error(f"Error fetching expenses: {e}")
+        return json_response({"message": "Failed to fetch expenses", "error": f"{e}"}, 500)
+
+    return json_response(payload, headers={"ETag": quote_etag(etag)})
+
+async def get_changes(request):
+    group_id = int_arg(request, 'group_id')
+    if group_id is None:
+        return json_response({"message": "Group ID is required"}, 400)
+
+    try:
+        since = decode_sync_token(request.query_params.get('since'))
+    except InvalidCursor:
+        return json_response({"message": "Invalid sync token"}, 400)
+
+    try:
+        async with flask_app.AsyncSession() as session:
+            group = await session.get(Group, group_id)
+            if group is None:
+                return json_response({"message": "Group not found"}, 404)
+
+            changes = await session.run_sync(changes_since, group, since)
+    except Exception as e:
+        flask_app.logger.error(f"Error fetching group changes: {e}")
+        return json_response({"message": "Failed to fetch group changes", "error": f"{e}"}, 500)
+
+    return json_response({"group_id": group_id, **changes})
+
+async def get_users(request):
+    if any(name in request.query_params for name in ('fields', 'depth')):
+        return None
+
+    user_id = int_arg(request, 'user_id')
+    username = request.query_params.get('username')
+    cursor = request.query_params.get('cursor')
+    limit = get_limit(request)
+
+    if user_id is not None:
+        try:
+            async with flask_app.AsyncSession() as session:
+                user = await session.get(User, user_id)
+                if user is None:
+                    return json_response({"message": "User not found"}, 404)
+                user_dict = user.to_dict()
+        except Exception as e:
+            flask_app.logger.error(f"Error fetching user: {e}")
+            return json_response({"message": "Failed to fetch user", "error": f"{e}"}, 500)
+
+        return json_response({"users": [user_dict]})
+
+    def search(sync_session):
+        query = sync_session.query(User)
+
+        if username is None:
+            users, next_cursor = paginate(query, [User.id], cursor, limit)
+        else:
+            query, columns = username_prefix_search(sync_session, query, username)
+            rows, next_cursor = paginate(
+                query, columns, cursor, limit,
+                cursor_values=lambda row: [row[1], row[0].id]
+            )
+            users = [user for user, _ in rows]
+        return [user.to_dict() for user in users], next_cursor
+
+    try:
+        async with flask_app.AsyncSession() as session:
+            users_list, next_cursor = await session.run_sync(search)
+    except InvalidCursor:
+        return json_response({"message": "Invalid cursor"}, 400)
+    except Exception as e:
+        if username is not None:
+            flask_app.logger.error(f"Error searching users by username: {e}")
+            return json_response({"message": "Failed to search users", "error": f"{e}"}, 500)
+
+        flask_app.logger.error(f"Error fetching users: {e}")
+        return json_response({"message": "Failed to fetch users", "error": f"{e}"}, 500)
+
+    return json_response({"users": users_list, "next_cursor": next_cursor})
+
+async def get_user_balances(request):
+    identity = jwt_identity(request)
+    if identity is None:
+        return None
+    user_id = int(identity)
+
+    try:
+        async with flask_app.AsyncSession() as session:
+            # The aggregate only runs when the client's copy is out of date
+            etag, unchanged = conditional(request, user_id, await session.run_sync(user_group_versions, user_id))
+            if unchanged:
+                return unchanged
+
+            groups = await session.run_sync(user_balances, user_id)
+    except Exception as e:
+        flask_app.logger.error(f"Error fetching user balances: {e}")
+        return json_response({"message": "Failed to fetch balances", "error": f"{e}"}, 500)
+
+    owed_to_user = sum((group["balance"] for group in groups if group["balance"] > BALANCE_TOLERANCE), 0.0)
+    owed_by_user = -sum((group["balance"] for group in groups if group["balance"] < -BALANCE_TOLERANCE), 0.0)
+
+    return json_response({
+        "user_id": user_id,
+        "groups": groups,
+        "owed_to_user": owed_to_user,
+        "owed_by_user": owed_by_user,
+        "net": owed_to_user - owed_by_user
+    }, headers={"ETag": quote_etag(etag)})
+
+async def login(request):
+    data = await json_body(request)
+    if not isinstance(data, dict):
+        return None
+
+    if not all(key in data for key in ('username', 'password')):
+        return json_response({"message": "Missing required fields"}, 400)
+
+    # Hashes run on a worker thread (or the process pool behind it), never on the loop
+    hasher = flask_app.password_hasher
+
+    async with flask_app.AsyncSession() as session:
+        user = await session.scalar(select(User).where(User.username == data['username']).limit(1))
+        user_dict = user.to_dict() if user else None
+
+        try:
+            verified = user is not None and await asyncio.to_thread(hasher.verify, user.password, data['password'])
+        except HasherOverloaded as e:
+            flask_app.logger.warning(f"Password hashing overloaded: {e}")
+            return json_response({"message": "Server busy, try again shortly"}, 503, headers={"Retry-After": "1"})
+
+        # Same best-effort upgrade of old hashes as the Flask handler
+        try:
+            if verified and await asyncio.to_thread(hasher.needs_rehash, user.password):
+                user.password = await asyncio.to_thread(hasher.hash, data['password'])
+                await session.commit()
+        except Exception as e:
+            flask_app.logger.error(f"Error rehashing password for user {user_dict['id']}: {e}")
+            await session.rollback()
+
+    if not verified:
+        return json_response({"message": "Invalid username or password"}, 401)
+
+    with flask_app.app_context():
+        access_token = create_access_token(identity=str(user_dict['id']))
+    return json_response({"access_token": access_token, "user": user_dict})
+
+async def next_event(subscription, wakeup, timeout):
+    # Waits on the event loop rather than in Subscription.get(), so an idle stream holds
+    # no thread. The second check catches an event published just before the clear().
+    event = subscription.get(timeout=0)
+    if event is None:
+        wakeup.clear()
+        event = subscription.get(timeout=0)
+
+    if event is None:
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        event = subscription.get(timeout=0)
+
+    return event
+
+async def stream_group_events(request):
+    group_id = int_arg(request, 'group_id')
+    if group_id is None:
+        return json_response({"message": "Group ID is required"}, 400)
+
+    try:
+        async with flask_app.AsyncSession() as session:
+            if await session.get(Group, group_id) is None:
+                return json_response({"message": "Group not found"}, 404)
+    except Exception as e:
+        flask_app.logger.error(f"Error opening group stream: {e}")
+        return json_response({"message": "Failed to open group stream", "error": f"{e}"}, 500)
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    # Publishers run on other threads (Flask writes, the Redis listener)
+    def notify():
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass
+
+    subscription = flask_app.events.subscribe(group_channel(group_id), notify)
+    dumps = flask_app.json.dumps
+    heartbeat_seconds = float(flask_app.settings.get('EVENTS_HEARTBEAT_SECONDS', 15))
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+
+            while True:
+                event = await next_event(subscription, wakeup, heartbeat_seconds)
+
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield f"event: resync\ndata: {dumps({'group_id': group_id})}\n\n"
+
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Handlers by (method, path); a handler returning None hands the request to Flask
+ASYNC_ROUTES = {
+    ('GET', '/heartbeat'): heartbeat,
+    ('GET', '/users/'): get_users,
+    ('GET', '/users/balances'): get_user_balances,
+    ('POST', '/users/login'): login,
+    ('GET', '/groups/'): get_group,
+    ('GET', '/groups/changes'): get_changes,
+    ('GET', '/groups/stream'): stream_group_events,
+    ('GET', '/expenses/'): get_expenses,
+}
+
+# endpoint and rule are the Flask ones, so metrics and payload-log sampling match
+NativeRoute = namedtuple('NativeRoute', 'handler endpoint rule')
+
+def resolve_routes(wsgi_app, routes):
+    adapter = wsgi_app.url_map.bind('localhost')
+    resolved = {}
+
+    for (method, path), handler in routes.items():
+        rule, _ = adapter.match(path, method=method, return_rule=True)
+        resolved[(method, path)] = NativeRoute(handler, rule.endpoint, rule.rule)
+
+    return resolved
+
+# Hands a body already read by a native handler to the Flask fallback
+def replay_body(body, receive):
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    return replay
+
+# What flask-cors adds to every response (origins "*" with credentials)
+def add_cors_headers(request, response):
+    origin = request.headers.get('origin')
+    if origin:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers.add_vary_header('Origin')
+
+class AsyncApp:
+    def __init__(self, wsgi_app, routes):
+        self.wsgi_app = wsgi_app
+        self.routes = resolve_routes(wsgi_app, routes)
+        self.fallback = WSGIMiddleware(wsgi_app, workers=int(wsgi_app.settings.get('ASGI_FALLBACK_WORKERS', 10)))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        route = self.routes.get((scope['method'], scope['path'])) if scope['type'] == 'http' else None
+        if route is not None:
+            request = Request(scope, receive)
+            stats = self.wsgi_app.metrics.start_request()
+            response = await route.handler(request)
+
+            if response is not None:
+                return await self.respond(route, request, response, stats, scope, receive, send)
+
+            self.wsgi_app.metrics.abandon_request()
+            body = getattr(request.state, 'body', None)
+            if body is not None:
+                receive = replay_body(body, receive)
+
+        await self.fallback(scope, receive, send)
+
+    async def respond(self, route, request, response, stats, scope, receive, send):
+        add_cors_headers(request, response)
+
+        # Blueprint routes only, like the Flask hooks set up by setup_blueprint
+        payload_log = self.wsgi_app.payload_log
+        if route.endpoint.rpartition('.')[0] in self.wsgi_app.blueprints and payload_log.sample(route.endpoint):
+            is_json = request.headers.get('content-type', '').startswith('application/json')
+            body = await request.body() if is_json else b''
+            payload_log.log_request(scope['method'], scope['path'], dict(request.query_params), body)
+
+            if isinstance(response, StreamingResponse):
+                payload_log.log_response(response.status_code, b'[streamed]', False)
+            else:
+                payload_log.log_response(response.status_code, response.body, response.media_type == 'application/json')
+
+        # Streamed bodies are measured until the last chunk is sent or the client leaves
+        async def counting_send(message):
+            if message['type'] == 'http.response.body':
+                stats.bytes += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await response(scope, receive, counting_send)
+        finally:
+            self.wsgi_app.metrics.complete_request((scope['method'], route.rule), full_path(request), response.status_code, stats)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await flask_app.async_engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+app = AsyncApp(flask_app, ASYNC_ROUTES)
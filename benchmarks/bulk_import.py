@@ -0,0 +1,60 @@
+import random
+import time
+import click
+from benchmarks.generate import SCALES
+from benchmarks.load import Call, HttpTarget, InProcessTarget, LoadState, authenticate, expense_payload
+from benchmarks.run import prepare_dataset
+from app import create_app
+
+# python -m benchmarks.bulk_import --database-url sqlite:///bench.db --batch-size 10 --batch-size 100 --batch-size 1000
+#
+# Imports the same expenses twice per batch size: once as a single POST /expenses/bulk
+# and once as one POST /expenses/ per expense, and reports rows/sec (expenses plus
+# splits) side by side. Every run adds its expenses to the seeded dataset.
+
+def import_bulk(target, token, group_id, payloads):
+    status, body = target.request(Call("POST /expenses/bulk", "POST", f"/expenses/bulk?group_id={group_id}", token,
+                                       json={"expenses": payloads}))
+    if status != 201:
+        raise RuntimeError(f"Bulk import failed with {status}: {body[:200]!r}")
+
+def import_sequential(target, token, group_id, payloads):
+    for payload in payloads:
+        status, body = target.request(Call("POST /expenses/", "POST", f"/expenses/?group_id={group_id}", token, json=payload))
+        if status != 201:
+            raise RuntimeError(f"Expense creation failed with {status}: {body[:200]!r}")
+
+@click.command()
+@click.option('--database-url', envvar='DATABASE_URL', required=True, help="Database to seed and import into.")
+@click.option('--url', default=None, help="Import through a running server instead of the app in-process.")
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small', help="Dataset size when seeding.")
+@click.option('--batch-size', 'batch_sizes', type=int, multiple=True, default=(10, 100, 1000), show_default=True)
+@click.option('--seed', type=int, default=0)
+def main(database_url, url, scale, batch_sizes, seed):
+    rng = random.Random(seed)
+    state = LoadState(prepare_dataset(database_url, scale, seed))
+    target = HttpTarget(url) if url else InProcessTarget(create_app({"DATABASE_URL": database_url}))
+
+    authenticate(target, state, 1, rng)
+    user_id, token = state.sessions[0]
+    group_id = state.member_group(rng, user_id)
+
+    click.echo(f"Importing into group {group_id} ({len(state.groups[group_id]['members'])} members) via {target.name}")
+    click.echo(f"{'batch':>7} {'path':<12} {'seconds':>9} {'expenses/s':>11} {'rows/s':>10} {'speedup':>8}")
+
+    for batch_size in batch_sizes:
+        payloads = [expense_payload(state, rng, user_id, group_id) for _ in range(batch_size)]
+        rows = batch_size + sum(len(payload['splits']) for payload in payloads)
+        timings = {}
+
+        for path, run in (("sequential", import_sequential), ("bulk", import_bulk)):
+            start = time.perf_counter()
+            run(target, token, group_id, payloads)
+            timings[path] = time.perf_counter() - start
+
+        for path, seconds in timings.items():
+            click.echo(f"{batch_size:>7} {path:<12} {seconds:>9.3f} {batch_size / seconds:>11.0f} {rows / seconds:>10.0f} "
+                       f"{timings['sequential'] / seconds:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import click
+from benchmarks.report import compare, format_comparison, read_results
+
+# python -m benchmarks.compare base.json head.json --fail-over 10
+
+@click.command()
+@click.argument('base', type=click.Path(exists=True, dir_okay=False))
+@click.argument('head', type=click.Path(exists=True, dir_okay=False))
+@click.option('--fail-over', type=float, default=None,
+              help="Exit non-zero if any route's p95 or throughput is this many percent worse.")
+def main(base, head, fail_over):
+    base_results = read_results(base)
+    head_results = read_results(head)
+    rows = compare(base_results, head_results)
+
+    click.echo(f"base: {base_results['meta'].get('commit')} ({base_results['meta']['target']}, {base_results['meta']['database']})")
+    click.echo(f"head: {head_results['meta'].get('commit')} ({head_results['meta']['target']}, {head_results['meta']['database']})")
+    click.echo(format_comparison(rows))
+
+    if fail_over is not None:
+        regressions = [
+            row["route"] for row in rows
+            if "missing" not in row and any(
+                row[key][2] is not None and row[key][2] > fail_over for key in ("throughput", "p95_ms")
+            )
+        ]
+
+        if regressions:
+            click.echo(f"Regressed by more than {fail_over}%: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
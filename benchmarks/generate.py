@@ -0,0 +1,151 @@
+import datetime
+import random
+import click
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from model import User, Group, Expense, ExpenseSplit, group_membership
+from util.balances import rebuild_balances
+from util.passwords import PasswordHasher
+
+# Seeded synthetic data for the load benchmarks. The same scale and seed always produce
+# the same rows, so runs against different commits start from identical databases.
+# Group sizes follow a power law: most groups are a handful of friends, a few are large.
+
+SCALES = {
+    "small": {"users": 200, "groups": 60, "max_members": 25, "expenses_per_member": 5},
+    "medium": {"users": 2000, "groups": 600, "max_members": 60, "expenses_per_member": 10},
+    "large": {"users": 20000, "groups": 6000, "max_members": 150, "expenses_per_member": 20},
+}
+
+USERNAME_PREFIX = "bench-"
+PASSWORD = "benchmark-password"
+
+TITLES = ("Groceries", "Rent", "Dinner", "Utilities", "Gas", "Tickets", "Coffee", "Hotel", "Taxi", "Drinks")
+BATCH_SIZE = 5000
+
+def member_count(rng, max_members, alpha=1.6):
+    # Pareto tail: P(size > x) ~ x^-alpha, at least two members per group
+    return min(max_members, int(rng.paretovariate(alpha) * 2))
+
+def split_amounts(rng, total, participants):
+    weights = [rng.uniform(0.5, 1.5) for _ in participants]
+    shares = [round(total * weight / sum(weights), 2) for weight in weights]
+    # Rounding remainder goes to the first participant so shares add up to the total
+    shares[0] = round(total - sum(shares[1:]), 2)
+    return dict(zip(participants, shares))
+
+def _insert_returning_ids(session, model, rows):
+    ids = []
+    for start in range(0, len(rows), BATCH_SIZE):
+        ids.extend(session.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows[start:start + BATCH_SIZE]
+        ).scalars())
+    return ids
+
+def _insert(session, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.execute(insert(table), rows[start:start + BATCH_SIZE])
+
+def generate(session, users, groups, max_members, expenses_per_member, seed=0, password_hash=None):
+    rng = random.Random(seed)
+    password_hash = password_hash or PasswordHasher(workers=0).hash(PASSWORD)
+
+    user_ids = _insert_returning_ids(session, User, [
+        {
+            "username": f"{USERNAME_PREFIX}{i:06d}",
+            "password": password_hash,
+            "first_name": "Bench",
+            "last_name": f"User{i}"
+        }
+        for i in range(users)
+    ])
+
+    members = [rng.sample(user_ids, min(member_count(rng, max_members), len(user_ids))) for _ in range(groups)]
+    group_ids = _insert_returning_ids(session, Group, [
+        {"name": f"Group {i}", "owner_id": group_members[0]} for i, group_members in enumerate(members)
+    ])
+    members = dict(zip(group_ids, members))
+
+    _insert(session, group_membership, [
+        {"group_id": group_id, "user_id": user_id}
+        for group_id, group_members in members.items() for user_id in group_members
+    ])
+
+    today = datetime.date.today()
+    expense_rows = []
+    split_rows = []
+
+    for group_id, group_members in members.items():
+        for _ in range(len(group_members) * expenses_per_member):
+            payer = rng.choice(group_members)
+            total = round(rng.lognormvariate(3, 1), 2)
+            participants = [payer] + rng.sample([m for m in group_members if m != payer], rng.randint(1, len(group_members) - 1))
+            shares = split_amounts(rng, total, participants)
+
+            expense_rows.append({
+                "title": rng.choice(TITLES),
+                "description": "",
+                "date": today - datetime.timedelta(days=rng.randrange(730)),
+                "totalCost": total,
+                "paid_by_id": payer,
+                "payer_portion": shares[payer],
+                "group_id": group_id
+            })
+            split_rows.append([
+                {"user_id": user_id, "amount_paid": total if user_id == payer else 0.0, "amount_owed": share}
+                for user_id, share in shares.items()
+            ])
+
+    expense_ids = _insert_returning_ids(session, Expense, expense_rows)
+    _insert(session, ExpenseSplit, [
+        {**split, "expense_id": expense_id} for expense_id, splits in zip(expense_ids, split_rows) for split in splits
+    ])
+
+    # The ledger is derived from the splits, exactly as the write handlers would leave it
+    rebuild_balances(session)
+    session.commit()
+
+    return load_dataset(session)
+
+# Reads back what the load driver needs to pick realistic targets
+def load_dataset(session):
+    users = dict(session.execute(
+        select(User.id, User.username).where(User.username.startswith(USERNAME_PREFIX)).order_by(User.id)
+    ).all())
+
+    groups = {}
+    for group_id, owner_id in session.execute(
+        select(Group.id, Group.owner_id).where(Group.owner_id.in_(users)).order_by(Group.id)
+    ):
+        groups[group_id] = {"owner_id": owner_id, "members": [], "expenses": []}
+
+    for group_id, user_id in session.execute(
+        select(group_membership.c.group_id, group_membership.c.user_id).order_by(group_membership.c.group_id)
+    ):
+        if group_id in groups:
+            groups[group_id]["members"].append(user_id)
+
+    for group_id, expense_id in session.execute(select(Expense.group_id, Expense.id).order_by(Expense.id)):
+        if group_id in groups:
+            groups[group_id]["expenses"].append(expense_id)
+
+    return {"users": users, "groups": groups}
+
+@click.command()
+@click.option('--database-url', envvar='DATABASE_URL', required=True, help="Database to seed (schema from alembic upgrade head).")
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small')
+@click.option('--seed', type=int, default=0)
+def main(database_url, scale, seed):
+    engine = create_engine(database_url)
+
+    with Session(engine) as session:
+        if session.scalar(select(User.id).where(User.username.startswith(USERNAME_PREFIX)).limit(1)) is not None:
+            raise click.ClickException("Benchmark data already present; seed an empty database.")
+
+        dataset = generate(session, seed=seed, **SCALES[scale])
+
+    expenses = sum(len(group["expenses"]) for group in dataset["groups"].values())
+    click.echo(f"Seeded {len(dataset['users'])} users, {len(dataset['groups'])} groups, {expenses} expenses ({scale}, seed {seed}).")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from urllib.parse import urlsplit
+from benchmarks.generate import USERNAME_PREFIX, PASSWORD
+from util.sync import encode_sync_token
+
+# Load driver for the users, groups and expenses blueprints. Worker threads draw
+# operations from a weighted traffic mix and time each request end to end. Writes only
+# ever update or delete rows the run itself created, so the seeded dataset stays the
+# same from one run to the next.
+
+# route labels the sample; after(status, body) lets writes record what they created
+Call = namedtuple('Call', 'route method path token json stream after', defaults=(None, None, False, None))
+
+# A (status, bytes, seconds) sample; status 0 is a connection error
+Sample = namedtuple('Sample', 'route status size seconds')
+
+class InProcessTarget:
+    # Drives the Flask app through its test client: no network, same handlers
+    name = "in-process"
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def request(self, call):
+        headers = {"Authorization": f"Bearer {call.token}"} if call.token else {}
+        response = self._client().open(call.path, method=call.method, json=call.json, headers=headers, buffered=False)
+
+        try:
+            # Streams never end; the first chunk is the "retry:" preamble
+            body = next(iter(response.response), b'') if call.stream else response.get_data()
+        finally:
+            response.close()
+
+        return response.status_code, body if isinstance(body, bytes) else body.encode()
+
+    # Returns the stream's chunks and the socket to shut down to end it (none in-process)
+    def open_stream(self, path):
+        response = self.app.test_client().get(path, buffered=False)
+        return iter(response.response), None
+
+class HttpTarget:
+    # Drives a running server (flask run, gunicorn, uvicorn asgi:app) over keep-alive connections
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.name = url
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.prefix = parts.path.rstrip('/')
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def request(self, call):
+        connection = self._connection()
+        headers = {"Authorization": f"Bearer {call.token}"} if call.token else {}
+        body = None
+
+        if call.json is not None:
+            body = json.dumps(call.json).encode()
+            headers["Content-Type"] = "application/json"
+
+        try:
+            connection.request(call.method, self.prefix + call.path, body=body, headers=headers)
+            response = connection.getresponse()
+
+            if call.stream:
+                data = response.readline()
+                connection.close()
+                self._local.connection = None
+            else:
+                data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+
+        return response.status, data
+
+    def open_stream(self, path):
+        connection = self.connection_class(self.host, self.port)
+        connection.request('GET', self.prefix + path)
+        response = connection.getresponse()
+
+        return iter(response.readline, b''), connection.sock
+
+class LoadState:
+    def __init__(self, dataset):
+        self.usernames = dataset['users']
+        self.user_ids = list(self.usernames)
+        self.groups = dataset['groups']
+        self.group_ids = list(self.groups)
+
+        self.user_groups = {}
+        for group_id, group in self.groups.items():
+            for user_id in group['members']:
+                self.user_groups.setdefault(user_id, []).append(group_id)
+
+        # (user_id, token) pairs the workers act as, filled by authenticate()
+        self.sessions = []
+
+        # Rows created during the run, available to later updates and deletes
+        self.lock = threading.Lock()
+        self.pending_logins = []
+        self.created_users = []
+        self.created_groups = []
+        self.created_expenses = []
+
+    def session(self, rng):
+        return rng.choice(self.sessions)
+
+    def member_group(self, rng, user_id):
+        return rng.choice(self.user_groups[user_id])
+
+    def pop(self, rows, rng):
+        with self.lock:
+            return rows.pop(rng.randrange(len(rows))) if rows else None
+
+    def pick(self, rows, rng):
+        with self.lock:
+            return rng.choice(rows) if rows else None
+
+    def add(self, rows, row):
+        with self.lock:
+            rows.append(row)
+
+def json_body(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {}
+
+# Operations: each returns the Call to make, or None when it has nothing to act on yet
+
+def get_user(state, rng):
+    return Call("GET /users/?user_id", "GET", f"/users/?user_id={rng.choice(state.user_ids)}")
+
+def search_users(state, rng):
+    prefix = state.usernames[rng.choice(state.user_ids)][:len(USERNAME_PREFIX) + 4]
+    return Call("GET /users/?username", "GET", f"/users/?username={prefix}")
+
+def user_balances(state, rng):
+    user_id, token = state.session(rng)
+    return Call("GET /users/balances", "GET", "/users/balances", token)
+
+def create_user(state, rng):
+    username = f"{USERNAME_PREFIX}new-{uuid.uuid4().hex[:12]}"
+
+    def after(status, body):
+        if status == 201:
+            state.add(state.pending_logins, (json_body(body)['user']['id'], username))
+
+    return Call("POST /users/", "POST", "/users/", json={
+        "username": username, "password": PASSWORD, "first_name": "New", "last_name": "User"
+    }, after=after)
+
+def login(state, rng):
+    # Users created by this run log in first, which is what makes them deletable
+    pending = state.pop(state.pending_logins, rng)
+    user_id, username = pending or (None, state.usernames[rng.choice(state.user_ids)])
+
+    def after(status, body):
+        if pending and status == 200:
+            state.add(state.created_users, (user_id, json_body(body)['access_token']))
+
+    return Call("POST /users/login", "POST", "/users/login", json={"username": username, "password": PASSWORD}, after=after)
+
+def update_user(state, rng):
+    user_id, token = state.session(rng)
+    return Call("PUT /users/", "PUT", f"/users/?user_id={user_id}", token, json={"first_name": "Bench"})
+
+def delete_user(state, rng):
+    created = state.pop(state.created_users, rng)
+    if created is None:
+        return None
+
+    user_id, token = created
+    return Call("DELETE /users/", "DELETE", f"/users/?user_id={user_id}", token)
+
+def get_group(state, rng):
+    user_id, token = state.session(rng)
+    return Call("GET /groups/?group_id", "GET", f"/groups/?group_id={state.member_group(rng, user_id)}", token)
+
+def list_groups(state, rng):
+    user_id, token = state.session(rng)
+    return Call("GET /groups/?user_id", "GET", f"/groups/?user_id={user_id}", token)
+
+def group_balances(state, rng):
+    return Call("GET /groups/balances", "GET", f"/groups/balances?group_id={rng.choice(state.group_ids)}")
+
+def settle_group(state, rng):
+    return Call("GET /groups/settle", "GET", f"/groups/settle?group_id={rng.choice(state.group_ids)}")
+
+def group_summary(state, rng):
+    by = rng.choice(('month', 'payer', 'member'))
+    return Call("GET /groups/summary", "GET", f"/groups/summary?group_id={rng.choice(state.group_ids)}&by={by}")
+
+def group_changes(state, rng):
+    # Half full syncs, half deltas from a recent token
+    since = f"&since={encode_sync_token(rng.randint(0, 2))}" if rng.random() < 0.5 else ""
+    return Call("GET /groups/changes", "GET", f"/groups/changes?group_id={rng.choice(state.group_ids)}{since}")
+
+def open_group_stream(state, rng):
+    return Call("GET /groups/stream", "GET", f"/groups/stream?group_id={rng.choice(state.group_ids)}", stream=True)
+
+def create_group(state, rng):
+    user_id, token = state.session(rng)
+
+    def after(status, body):
+        if status == 201:
+            state.add(state.created_groups, {"id": json_body(body)['group']['id'], "token": token, "members": []})
+
+    return Call("POST /groups/", "POST", "/groups/", token, json={"name": "Benchmark group"}, after=after)
+
+def update_group(state, rng):
+    group = state.pick(state.created_groups, rng)
+    if group is None:
+        return None
+    return Call("PUT /groups/", "PUT", f"/groups/?group_id={group['id']}", group['token'], json={"name": "Renamed group"})
+
+def delete_group(state, rng):
+    group = state.pop(state.created_groups, rng)
+    if group is None:
+        return None
+    return Call("DELETE /groups/", "DELETE", f"/groups/?group_id={group['id']}", group['token'])
+
+def add_member(state, rng):
+    group = state.pick(state.created_groups, rng)
+    if group is None:
+        return None
+
+    user_id = rng.choice(state.user_ids)
+
+    def after(status, body):
+        if status == 200:
+            with state.lock:
+                group['members'].append(user_id)
+
+    return Call("POST /groups/members", "POST", f"/groups/members?group_id={group['id']}", group['token'],
+                json={"user_id": user_id}, after=after)
+
+def remove_member(state, rng):
+    group = state.pick(state.created_groups, rng)
+    if group is None:
+        return None
+
+    with state.lock:
+        if not group['members']:
+            return None
+        user_id = group['members'].pop()
+
+    return Call("DELETE /groups/members", "DELETE", f"/groups/members?group_id={group['id']}", group['token'],
+                json={"user_id": user_id})
+
+def get_expenses(state, rng):
+    user_id, token = state.session(rng)
+    return Call("GET /expenses/", "GET", f"/expenses/?group_id={state.member_group(rng, user_id)}", token)
+
+def export_expenses(state, rng):
+    export_format = rng.choice(('csv', 'ndjson'))
+    return Call("GET /expenses/export", "GET",
+                f"/expenses/export?group_id={rng.choice(state.group_ids)}&format={export_format}")
+
+def expense_payload(state, rng, user_id, group_id):
+    total = round(rng.uniform(5, 200), 2)
+    other = rng.choice([member for member in state.groups[group_id]['members'] if member != user_id] or [user_id])
+    splits = [{"user_id": user_id, "amount_paid": total, "amount_owed": round(total / 2, 2)}]
+
+    if other != user_id:
+        splits.append({"user_id": other, "amount_paid": 0.0, "amount_owed": round(total - total / 2, 2)})
+
+    return {
+        "title": "Benchmark", "description": "", "total_cost": total,
+        "payer_portion": splits[0]['amount_owed'], "splits": splits
+    }
+
+def create_expense(state, rng):
+    user_id, token = state.session(rng)
+    group_id = state.member_group(rng, user_id)
+
+    def after(status, body):
+        if status == 201:
+            state.add(state.created_expenses, (json_body(body)['expense']['id'], token))
+
+    return Call("POST /expenses/", "POST", f"/expenses/?group_id={group_id}", token,
+                json=expense_payload(state, rng, user_id, group_id), after=after)
+
+def bulk_create_expenses(state, rng):
+    user_id, token = state.session(rng)
+    group_id = state.member_group(rng, user_id)
+    expenses = [expense_payload(state, rng, user_id, group_id) for _ in range(20)]
+
+    return Call("POST /expenses/bulk", "POST", f"/expenses/bulk?group_id={group_id}", token, json={"expenses": expenses})
+
+def update_expense(state, rng):
+    created = state.pick(state.created_expenses, rng)
+    if created is None:
+        return None
+
+    expense_id, token = created
+    return Call("PUT /expenses/", "PUT", f"/expenses/?expense_id={expense_id}", token, json={"title": "Updated"})
+
+def delete_expense(state, rng):
+    created = state.pop(state.created_expenses, rng)
+    if created is None:
+        return None
+
+    expense_id, token = created
+    return Call("DELETE /expenses/", "DELETE", f"/expenses/?expense_id={expense_id}", token)
+
+OPERATIONS = {operation.__name__: operation for operation in (
+    get_user, search_users, user_balances, create_user, login, update_user, delete_user,
+    get_group, list_groups, group_balances, settle_group, group_summary, group_changes, open_group_stream,
+    create_group, update_group, delete_group, add_member, remove_member,
+    get_expenses, export_expenses, create_expense, bulk_create_expenses, update_expense, delete_expense,
+)}
+
+# Relative weights; "mixed" touches every route
+MIXES = {
+    "read": {
+        "get_user": 5, "search_users": 5, "user_balances": 10, "get_group": 20, "list_groups": 15, "group_balances": 10,
+        "settle_group": 5, "group_summary": 5, "group_changes": 10, "get_expenses": 20, "export_expenses": 1,
+    },
+    "mixed": {
+        "get_user": 4, "search_users": 4, "user_balances": 6, "create_user": 1, "login": 2, "update_user": 1, "delete_user": 1,
+        "get_group": 15, "list_groups": 10, "group_balances": 8, "settle_group": 4, "group_summary": 4, "group_changes": 8,
+        "open_group_stream": 1, "create_group": 2, "update_group": 1, "delete_group": 1, "add_member": 2,
+        "remove_member": 1, "get_expenses": 15, "export_expenses": 1, "create_expense": 6,
+        "bulk_create_expenses": 1, "update_expense": 3, "delete_expense": 2,
+    },
+    "write": {
+        "get_group": 10, "get_expenses": 10, "create_user": 2, "login": 2, "update_user": 2, "delete_user": 2,
+        "create_group": 4, "update_group": 2, "delete_group": 2, "add_member": 4, "remove_member": 3,
+        "create_expense": 25, "bulk_create_expenses": 3, "update_expense": 15, "delete_expense": 10,
+    },
+}
+
+def authenticate(target, state, sessions, rng):
+    # Logs in members of the seeded groups; these tokens carry the authenticated traffic
+    members = sorted(state.user_groups)
+    for user_id in rng.sample(members, min(sessions, len(members))):
+        status, body = target.request(Call("POST /users/login", "POST", "/users/login", json={
+            "username": state.usernames[user_id], "password": PASSWORD
+        }))
+
+        if status != 200:
+            raise RuntimeError(f"Login for {state.usernames[user_id]} failed with {status}: {body[:200]!r}")
+        state.sessions.append((user_id, json_body(body)['access_token']))
+
+def run_load(target, state, mix, concurrency=4, duration=10.0, max_requests=None, seed=0):
+    operations = [OPERATIONS[name] for name in mix]
+    weights = list(mix.values())
+    samples = []
+    issued = iter(range(max_requests)) if max_requests else None
+    issued_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+
+        while time.perf_counter() < deadline:
+            if issued is not None:
+                with issued_lock:
+                    if next(issued, None) is None:
+                        return
+
+            call = rng.choices(operations, weights)[0](state, rng)
+            if call is None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                status, body = target.request(call)
+            except (http.client.HTTPException, OSError):
+                status, body = 0, b''
+            samples.append(Sample(call.route, status, len(body), time.perf_counter() - start))
+
+            if call.after is not None:
+                call.after(status, body)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return samples, time.perf_counter() - start
+
+class IdleStreams:
+    # Holds SSE subscribers open for the whole run, to measure what idle connections cost
+    def __init__(self, target, group_ids, count, rng):
+        self.target = target
+        self.paths = [f"/groups/stream?group_id={rng.choice(group_ids)}" for _ in range(count)]
+        self.sockets = []
+        self.opened = 0
+        self.chunks = 0
+        self._lock = threading.Lock()
+
+    def _hold(self, stream):
+        with self._lock:
+            self.opened += 1
+
+        try:
+            for _ in stream:
+                with self._lock:
+                    self.chunks += 1
+        except (http.client.HTTPException, OSError, ValueError):
+            pass
+
+    def start(self):
+        for path in self.paths:
+            stream, sock = self.target.open_stream(path)
+            self.sockets.append(sock)
+            threading.Thread(target=self._hold, args=(stream,), daemon=True).start()
+
+    def stop(self):
+        # HTTP streams are unblocked by shutting their sockets; in-process ones end with the process
+        for sock in self.sockets:
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        return {"streams": len(self.paths), "opened": self.opened, "chunks_received": self.chunks}
@@ -0,0 +1,60 @@
+import os
+import click
+from benchmarks.generate import SCALES
+from benchmarks.load import InProcessTarget, LoadState, run_load
+from benchmarks.report import summarize_samples
+from benchmarks.run import prepare_dataset
+from app import create_app
+
+# python -m benchmarks.login --database-url sqlite:///bench.db --workers 0 --workers 1 --workers 4
+#
+# POST /users/login throughput as the password hash pool grows. Each worker count gets
+# its own in-process app (PASSWORD_HASH_WORKERS) and the same number of concurrent
+# clients; 0 hashes inline on the request threads. Rejected logins (503, queue full)
+# are counted separately from successful ones.
+
+def default_workers():
+    cores = os.cpu_count() or 1
+    counts = [0, 1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+@click.command()
+@click.option('--database-url', envvar='DATABASE_URL', required=True, help="Database to seed and log in against.")
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small', help="Dataset size when seeding.")
+@click.option('--workers', 'worker_counts', type=int, multiple=True, help="Hash pool sizes (default: 0, 1, 2, 4... up to the core count).")
+@click.option('--concurrency', type=int, default=None, help="Concurrent clients (default: twice the core count).")
+@click.option('--duration', type=float, default=10.0, help="Seconds per pool size.")
+@click.option('--method', default=None, help="PASSWORD_HASH_METHOD for the run; seeded hashes are upgraded on first login.")
+@click.option('--seed', type=int, default=0)
+def main(database_url, scale, worker_counts, concurrency, duration, method, seed):
+    state = LoadState(prepare_dataset(database_url, scale, seed))
+    concurrency = concurrency or (os.cpu_count() or 1) * 2
+
+    click.echo(f"{os.cpu_count()} cores, {concurrency} concurrent clients, {duration:.0f} s per pool size")
+    click.echo(f"{'workers':>8} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'503s':>6} {'errors':>7}")
+
+    for workers in worker_counts or default_workers():
+        config = {"DATABASE_URL": database_url, "PASSWORD_HASH_WORKERS": str(workers)}
+        if method:
+            config["PASSWORD_HASH_METHOD"] = method
+        app = create_app(config)
+
+        try:
+            samples, elapsed = run_load(InProcessTarget(app), state, {"login": 1}, concurrency, duration, seed=seed)
+        finally:
+            app.password_hasher.shutdown()
+
+        succeeded = [sample for sample in samples if sample.status == 200]
+        rejected = sum(1 for sample in samples if sample.status == 503)
+        stats = summarize_samples(succeeded, elapsed)
+        p50, p99 = (f"{stats[key]:.1f}" if stats[key] is not None else "-" for key in ("p50_ms", "p99_ms"))
+
+        click.echo(f"{workers:>8} {stats['throughput']:>9.1f} {p50:>8} {p99:>8} "
+                   f"{rejected:>6} {len(samples) - len(succeeded) - rejected:>7}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import json
+import math
+from collections import defaultdict
+
+# Throughput and latency percentiles per route, stored as JSON so runs against two
+# commits (or SQLite vs PostgreSQL, flask vs uvicorn) can be diffed with compare.py
+
+PERCENTILES = (50, 95, 99)
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+def summarize_samples(samples, elapsed):
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample.status == 0 or sample.status >= 400),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(sample.seconds for sample in samples) * 1000 / len(samples) if samples else None,
+        "bytes": sum(sample.size for sample in samples),
+        **{
+            f"p{q}_ms": value * 1000 if value is not None else None
+            for q, value in ((q, percentile(sorted(sample.seconds for sample in samples), q)) for q in PERCENTILES)
+        }
+    }
+
+def summarize(samples, elapsed):
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample.route].append(sample)
+
+    return {
+        "elapsed_seconds": elapsed,
+        "total": summarize_samples(samples, elapsed),
+        "routes": {route: summarize_samples(route_samples, elapsed) for route, route_samples in sorted(by_route.items())}
+    }
+
+def _ms(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+def format_summary(summary):
+    rows = [("route", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms")]
+
+    for route, stats in [*summary["routes"].items(), ("TOTAL", summary["total"])]:
+        rows.append((
+            route, str(stats["requests"]), str(stats["errors"]), f"{stats['throughput']:.1f}",
+            _ms(stats["p50_ms"]), _ms(stats["p95_ms"]), _ms(stats["p99_ms"])
+        ))
+
+    return _table(rows)
+
+def _change(base, head, lower_is_better=True):
+    if base is None or head is None or base == 0:
+        return None
+    change = (head - base) / base * 100
+    return change if lower_is_better else -change
+
+# Per route: head vs base, as a percentage where positive means worse
+def compare(base, head):
+    rows = []
+    base_routes = {**base["summary"]["routes"], "TOTAL": base["summary"]["total"]}
+    head_routes = {**head["summary"]["routes"], "TOTAL": head["summary"]["total"]}
+
+    for route in [*sorted((set(base_routes) | set(head_routes)) - {"TOTAL"}), "TOTAL"]:
+        before = base_routes.get(route)
+        after = head_routes.get(route)
+
+        if before is None or after is None:
+            rows.append({"route": route, "missing": "base" if before is None else "head"})
+            continue
+
+        rows.append({
+            "route": route,
+            "throughput": (before["throughput"], after["throughput"], _change(before["throughput"], after["throughput"], False)),
+            **{
+                f"p{q}_ms": (before[f"p{q}_ms"], after[f"p{q}_ms"], _change(before[f"p{q}_ms"], after[f"p{q}_ms"]))
+                for q in PERCENTILES
+            }
+        })
+
+    return rows
+
+def format_comparison(rows):
+    table = [("route", "req/s", *(f"p{q} ms" for q in PERCENTILES))]
+
+    for row in rows:
+        if "missing" in row:
+            table.append((row["route"], f"(not in {row['missing']})", *("" for _ in PERCENTILES)))
+            continue
+
+        table.append((row["route"], *(
+            f"{_ms(before)} -> {_ms(after)}" + (f" ({change:+.0f}%)" if change is not None else "")
+            for before, after, change in (row[key] for key in ("throughput", *(f"p{q}_ms" for q in PERCENTILES)))
+        )))
+
+    return _table(table)
+
+def _table(rows):
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) if column == 0 else cell.rjust(width) for column, (cell, width) in enumerate(zip(row, widths)))
+        for row in rows
+    )
+
+def write_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
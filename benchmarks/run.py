@@ -0,0 +1,115 @@
+import datetime
+import random
+import subprocess
+import time
+import click
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from benchmarks.generate import SCALES, USERNAME_PREFIX, generate, load_dataset
+from benchmarks.load import MIXES, Call, HttpTarget, IdleStreams, InProcessTarget, LoadState, authenticate, json_body, run_load
+from benchmarks.report import format_summary, summarize, write_results
+from app import create_app
+from model import User
+
+# python -m benchmarks.run --database-url sqlite:///bench.db --mix mixed --output head.json
+#
+# Seeds the database on first use (schema from alembic upgrade head), then drives either
+# the app in-process or, with --url, a running server that uses the same database.
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_dataset(database_url, scale, seed):
+    engine = create_engine(database_url)
+
+    try:
+        with Session(engine) as session:
+            if session.scalar(select(User.id).where(User.username.startswith(USERNAME_PREFIX)).limit(1)) is None:
+                click.echo(f"Seeding {scale} dataset...")
+                return generate(session, seed=seed, **SCALES[scale])
+            return load_dataset(session)
+    finally:
+        engine.dispose()
+
+def cold_start(database_url, group_id):
+    # create_app() cost, then the first request and the first one that needs the database
+    app = create_app({"DATABASE_URL": database_url})
+    client = app.test_client()
+    timings = {"startup_seconds": app.startup_seconds}
+
+    for key, path in (("first_request_seconds", "/heartbeat"), ("first_db_request_seconds", f"/groups/?group_id={group_id}")):
+        start = time.perf_counter()
+        client.get(path).get_data()
+        timings[key] = time.perf_counter() - start
+
+    return app, timings
+
+@click.command()
+@click.option('--database-url', envvar='DATABASE_URL', required=True, help="Database to seed and benchmark.")
+@click.option('--url', default=None, help="Benchmark a running server instead of the app in-process.")
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small', help="Dataset size when seeding.")
+@click.option('--mix', type=click.Choice(list(MIXES)), default='mixed', help="Traffic mix.")
+@click.option('--concurrency', type=int, default=4, help="Worker threads.")
+@click.option('--duration', type=float, default=30.0, help="Seconds to run for.")
+@click.option('--requests', 'max_requests', type=int, default=None, help="Stop after this many requests.")
+@click.option('--sessions', type=int, default=20, help="Users to log in and send authenticated traffic as.")
+@click.option('--idle-streams', type=int, default=0, help="SSE subscribers held open during the run.")
+@click.option('--seed', type=int, default=0)
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help="Write results as JSON for compare.py.")
+def main(database_url, url, scale, mix, concurrency, duration, max_requests, sessions, idle_streams, seed, output):
+    rng = random.Random(seed)
+    state = LoadState(prepare_dataset(database_url, scale, seed))
+
+    if url:
+        target = HttpTarget(url)
+        timings = None
+    else:
+        app, timings = cold_start(database_url, state.group_ids[0])
+        target = InProcessTarget(app)
+
+    authenticate(target, state, sessions, rng)
+
+    streams = IdleStreams(target, state.group_ids, idle_streams, rng)
+    streams.start()
+
+    click.echo(f"Running {mix} mix against {target.name}: {concurrency} workers, {len(state.sessions)} sessions, "
+               f"{idle_streams} idle streams...")
+    samples, elapsed = run_load(target, state, MIXES[mix], concurrency, duration, max_requests, seed)
+    stream_stats = streams.stop()
+
+    status, body = target.request(Call("GET /stats", "GET", "/stats"))
+    summary = summarize(samples, elapsed)
+
+    click.echo(format_summary(summary))
+    if timings:
+        click.echo(f"Cold start: create_app {timings['startup_seconds'] * 1000:.1f} ms, first request "
+                   f"{timings['first_request_seconds'] * 1000:.1f} ms, first database request "
+                   f"{timings['first_db_request_seconds'] * 1000:.1f} ms")
+
+    if output:
+        write_results(output, {
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "target": target.name,
+                "database": database_url.split(':', 1)[0],
+                "scale": scale,
+                "mix": mix,
+                "concurrency": concurrency,
+                "sessions": len(state.sessions),
+                "seed": seed
+            },
+            "cold_start": timings,
+            "idle_streams": stream_stats,
+            "server_stats": json_body(body) if status == 200 else None,
+            "summary": summary
+        })
+        click.echo(f"Results written to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import io
+import json
+import logging
+import random
+import statistics
+import time
+import click
+from util.sensitive_info import SensitiveSanitizer
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# python -m benchmarks.sanitizer --megabytes 1 --megabytes 4 --megabytes 16
+#
+# SensitiveSanitizer on multi-megabyte payloads shaped like logged group snapshots:
+# groups of expenses whose users carry password hashes, plus a top-level access_token.
+# "old" is the sanitize_dict that shipped before the recursive rewrite; it only looks at
+# top-level keys, so "old, every level" applies it to every nested dict as well to show
+# the cost of the same coverage with a copy per dict.
+
+FIELDS = ['password', 'access_token']
+
+class OldSanitizer:
+    def __init__(self, logger, sensitive_fields=[]):
+        self.sensitive_fields = sensitive_fields
+        self.logger = logger
+
+    def sanitize_dict(self, data_dict):
+        data_dict = data_dict.copy()
+
+        for field in self.sensitive_fields:
+            if field in data_dict:
+                if isinstance(data_dict[field], str):
+                    data_dict[field] = "[REDACTED]"
+                elif isinstance(data_dict[field], list):
+                    data_dict[field] = ["[REDACTED]" for _ in data_dict[field]]
+                elif isinstance(data_dict[field], dict):
+                    data_dict[field] = {k: "[REDACTED]" for k in data_dict[field].keys()}
+                else:
+                    self.logger.warning(f"Unsupported type for sensitive field '{field}': {type(data_dict[field])}")
+                    return
+
+                self.logger.debug(f"Sensitive field '{field}' sanitized.")
+                data_dict[field] = "[REDACTED]"
+
+        return data_dict
+
+    def sanitize_every_level(self, value):
+        if isinstance(value, dict):
+            return {key: self.sanitize_every_level(item) for key, item in self.sanitize_dict(value).items()}
+        if isinstance(value, list):
+            return [self.sanitize_every_level(item) for item in value]
+        return value
+
+def make_user(rng, user_id, secret):
+    user = {"id": user_id, "username": f"user{user_id}", "first_name": "Bench", "last_name": "User"}
+    if secret:
+        user["password"] = "scrypt:32768:8:1$" + "".join(rng.choice("0123456789abcdef") for _ in range(64))
+    return user
+
+def make_payload(megabytes, secret_share, rng):
+    target = megabytes * 1024 * 1024
+    groups = []
+    size = 0
+    expense_id = 0
+
+    while size < target:
+        members = [make_user(rng, rng.randint(1, 100_000), rng.random() < secret_share) for _ in range(8)]
+        expenses = []
+
+        for _ in range(50):
+            expense_id += 1
+            payer = rng.choice(members)
+            expenses.append({
+                "id": expense_id,
+                "name": f"Expense {expense_id}",
+                "totalCost": round(rng.uniform(1, 500), 2),
+                "date": "2026-10-16",
+                "paid_by": payer,
+                "splits": [
+                    {"user": member, "amount_owed": 10.0, "amount_paid": 0.0} for member in members
+                ],
+            })
+
+        group = {"id": len(groups) + 1, "name": f"Group {len(groups) + 1}", "members": members, "expenses": expenses}
+        groups.append(group)
+        size += len(json.dumps(group))
+
+    return {"access_token": "eyJhbGciOiJIUzI1NiJ9." + "x" * 200, "groups": groups}
+
+def best_of(function, payload, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(payload)
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+@click.command()
+@click.option('--megabytes', type=int, multiple=True, default=(1, 4, 16), show_default=True, help="Payload sizes.")
+@click.option('--secret-share', type=float, default=0.5, show_default=True, help="Share of users carrying a password.")
+@click.option('--repeat', type=int, default=5, show_default=True)
+@click.option('--seed', type=int, default=0)
+def main(megabytes, secret_share, repeat, seed):
+    rng = random.Random(seed)
+    logger = logging.getLogger('benchmarks.sanitizer')
+    new = SensitiveSanitizer(logger, sensitive_fields=FIELDS)
+    old = OldSanitizer(logger, sensitive_fields=FIELDS)
+
+    implementations = [
+        ("new", new.sanitize_dict),
+        ("old", old.sanitize_dict),
+        ("old, every level", old.sanitize_every_level),
+    ]
+    if ijson is not None:
+        implementations.append(("new, streaming", lambda text: sum(1 for _ in new.sanitize_events(ijson.basic_parse(io.BytesIO(text))))))
+
+    click.echo(f"{'payload':>10} {'implementation':<18} {'best ms':>10} {'median ms':>10} {'MB/s':>8}")
+
+    for size in megabytes:
+        payload = make_payload(size, secret_share, rng)
+        encoded = json.dumps(payload).encode()
+        mb = len(encoded) / (1024 * 1024)
+
+        # Same object graph for all in-memory implementations; the new one never mutates it
+        for name, function in implementations:
+            argument = encoded if name == "new, streaming" else payload
+            best, median = best_of(function, argument, repeat)
+            click.echo(f"{mb:>8.1f}MB {name:<18} {best * 1000:>10.1f} {median * 1000:>10.1f} {mb / max(best, 1e-9):>8.1f}")
+
+        leaked = {name: json.dumps(sanitize(payload)).count('"password": "scrypt') for name, sanitize in implementations[:2]}
+        click.echo(f"{'':>10} unredacted nested passwords: new {leaked['new']}, old {leaked['old']}")
+
+if __name__ == '__main__':
+    main()
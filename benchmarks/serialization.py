@@ -0,0 +1,126 @@
+import datetime
+import random
+import time
+import click
+from sqlalchemy import func, insert, select
+from app import create_app
+from benchmarks.generate import BATCH_SIZE, TITLES, split_amounts
+from model import User, Group, Expense, ExpenseSplit, group_membership
+from util.dto import expense_page
+from util.json_provider import JSON_BACKENDS, create_json_provider, orjson
+from util.loader_profiles import EXPENSE_DETAIL
+from util.passwords import PasswordHasher
+
+# python -m benchmarks.serialization --database-url sqlite:///serialization.db --expenses 50000
+#
+# Serializing one group with 50k expenses: the ORM path (EXPENSE_DETAIL loads, then
+# Expense.to_dict() per expense) against the DTO path of GET /expenses/ (util.dto,
+# column rows straight into slotted dataclasses), each encoded by every available JSON
+# backend. Seeds the group on first use; reported times are the best of --repeat runs.
+
+GROUP_NAME = "serialization-bench"
+MEMBERS = 8
+
+def seed_group(session, expenses, rng):
+    group = session.scalar(select(Group).where(Group.name == GROUP_NAME))
+    if group is not None:
+        return group
+
+    password_hash = PasswordHasher(workers=0).hash("serialization")
+    member_ids = [
+        session.scalar(insert(User).returning(User.id).values(
+            username=f"ser-{index}", password=password_hash, first_name="Serial", last_name=f"Member{index}"
+        ))
+        for index in range(MEMBERS)
+    ]
+    group = Group(name=GROUP_NAME, owner_id=member_ids[0])
+    session.add(group)
+    session.flush()
+    session.execute(insert(group_membership), [{"user_id": user_id, "group_id": group.id} for user_id in member_ids])
+
+    start_date = datetime.date(2024, 1, 1)
+    for start in range(0, expenses, BATCH_SIZE):
+        rows = []
+        for index in range(start, min(start + BATCH_SIZE, expenses)):
+            total = round(rng.uniform(5, 300), 2)
+            rows.append({
+                "title": rng.choice(TITLES),
+                "description": f"Expense {index}",
+                "date": start_date + datetime.timedelta(days=index % 700),
+                "totalCost": total,
+                "paid_by_id": rng.choice(member_ids),
+                "payer_portion": 0.0,
+                "group_id": group.id,
+            })
+
+        ids = session.execute(
+            insert(Expense).returning(Expense.id, Expense.paid_by_id, Expense.totalCost, sort_by_parameter_order=True), rows
+        ).all()
+        session.execute(insert(ExpenseSplit), [
+            {
+                "expense_id": expense_id,
+                "user_id": user_id,
+                "amount_paid": total if user_id == paid_by_id else 0.0,
+                "amount_owed": owed,
+            }
+            for expense_id, paid_by_id, total in ids
+            for user_id, owed in split_amounts(rng, total, member_ids).items()
+        ])
+
+    session.commit()
+    return group
+
+def build_to_dict(session, group, count):
+    expenses = session.query(Expense).options(*EXPENSE_DETAIL).filter_by(group_id=group.id).order_by(Expense.date, Expense.id)
+    return [expense.to_dict() for expense in expenses]
+
+def build_dto(session, group, count):
+    # One page holding the whole group, like the to_dict() snapshot
+    expenses, _ = expense_page(session, group, limit=count)
+    return expenses
+
+def best_of(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+@click.command()
+@click.option('--database-url', envvar='DATABASE_URL', required=True, help="Database to seed and read (after alembic upgrade head).")
+@click.option('--expenses', type=int, default=50_000, show_default=True, help="Expenses in the benchmark group.")
+@click.option('--repeat', type=int, default=3, show_default=True)
+@click.option('--seed', type=int, default=0)
+def main(database_url, expenses, repeat, seed):
+    app = create_app({"DATABASE_URL": database_url})
+
+    with app.app_context():
+        with app.Session() as session:
+            group_id = seed_group(session, expenses, random.Random(seed)).id
+            count = session.scalar(select(func.count(Expense.id)).where(Expense.group_id == group_id))
+
+        backends = [name for name in JSON_BACKENDS if name != 'orjson' or orjson is not None]
+        providers = {name: create_json_provider(app, name) for name in backends}
+
+        click.echo(f"{count} expenses, {MEMBERS} splits each")
+        click.echo(f"{'path':<10} {'backend':<8} {'build ms':>10} {'encode ms':>10} {'total ms':>10} {'MB':>8}")
+
+        for path, build in (("to_dict", build_to_dict), ("dto", build_dto)):
+            # A fresh session per run, so the ORM path never reuses loaded objects
+            def run():
+                with app.Session() as session:
+                    return build(session, session.get(Group, group_id), count)
+
+            build_seconds, payload = best_of(run, repeat)
+
+            for name, provider in providers.items():
+                encode_seconds, body = best_of(lambda: provider.dumps(payload), repeat)
+                click.echo(
+                    f"{path:<10} {name:<8} {build_seconds * 1000:>10.1f} {encode_seconds * 1000:>10.1f} "
+                    f"{(build_seconds + encode_seconds) * 1000:>10.1f} {len(body) / (1024 * 1024):>8.1f}"
+                )
+
+if __name__ == '__main__':
+    main()
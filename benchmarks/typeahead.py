@@ -0,0 +1,77 @@
+import random
+import time
+import click
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from app import create_app
+from benchmarks.generate import BATCH_SIZE
+from benchmarks.load import Call, HttpTarget, InProcessTarget, Sample
+from benchmarks.report import format_summary, summarize
+from model import User
+from util.passwords import PasswordHasher
+
+# python -m benchmarks.typeahead --database-url sqlite:///typeahead.db --users 1000000
+#
+# Username typeahead (GET /users/?username=) against a large user table. Seeds the
+# users on first use, then times random 1-4 character prefixes of real usernames and
+# reports p50/p95/p99 per prefix length; short prefixes match the most rows.
+
+USERNAME_PREFIX = "ta-"
+SYLLABLES = ("ka", "lo", "mi", "ra", "te", "su", "no", "vi", "be", "do", "ha", "ji", "pe", "zo", "an", "el")
+
+def username(rng, index):
+    # Realistic spread of leading characters, unique through the index suffix
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) + str(index)
+
+def seed_users(session, users, rng):
+    password_hash = PasswordHasher(workers=0).hash("typeahead")
+    existing = session.scalar(select(func.count(User.id)).where(User.username.startswith(USERNAME_PREFIX)))
+
+    for start in range(existing, users, BATCH_SIZE):
+        session.execute(User.__table__.insert(), [
+            {"username": USERNAME_PREFIX + username(rng, index), "password": password_hash, "first_name": "Type", "last_name": "Ahead"}
+            for index in range(start, min(start + BATCH_SIZE, users))
+        ])
+        session.commit()
+
+    return existing
+
+@click.command()
+@click.option('--database-url', envvar='DATABASE_URL', required=True, help="Database to seed and query (after alembic upgrade head).")
+@click.option('--url', default=None, help="Query a running server instead of the app in-process.")
+@click.option('--users', type=int, default=1_000_000, help="Users to seed.")
+@click.option('--requests', 'count', type=int, default=2000, help="Searches to time.")
+@click.option('--seed', type=int, default=0)
+def main(database_url, url, users, count, seed):
+    rng = random.Random(seed)
+    engine = create_engine(database_url)
+
+    with Session(engine) as session:
+        existing = seed_users(session, users, rng)
+        if existing < users:
+            click.echo(f"Seeded {users - existing} users.")
+
+        # Prefixes are drawn from real usernames so every search has matches
+        sample = session.scalars(
+            select(User.username).where(User.username.startswith(USERNAME_PREFIX)).order_by(func.random()).limit(500)
+        ).all()
+    engine.dispose()
+
+    target = HttpTarget(url) if url else InProcessTarget(create_app({"DATABASE_URL": database_url}))
+    samples = []
+
+    for _ in range(count):
+        length = rng.randint(1, 4)
+        prefix = rng.choice(sample)[:len(USERNAME_PREFIX) + length]
+        call = Call(f"prefix length {length}", "GET", f"/users/?username={prefix}")
+
+        start = time.perf_counter()
+        status, body = target.request(call)
+        samples.append(Sample(call.route, status, len(body), time.perf_counter() - start))
+
+    summary = summarize(samples, sum(sample.seconds for sample in samples))
+    click.echo(f"{users} users, {count} searches against {target.name}:")
+    click.echo(format_summary(summary))
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,30 @@
-from flask import json, request, current_app
+from flask import g, request, current_app
 
 def setup_blueprint(app, blueprint):
-    # Log complete request information
-    @blueprint.before_request
+    # Log sampled request/response payloads through the queue-backed pipeline.
+    # Formatting and sanitizing happen on the listener thread, not here.
     def log_request_info():
-        query_params = app.sanitizer.sanitize_dict(request.args.to_dict() or {})
-        body = app.sanitizer.sanitize_dict(request.get_json(silent=True) or {})
+        g.log_payload = app.payload_log.sample(request.endpoint)
 
-        current_app.logger.info(f"\nRequest: {request.method} {request.path}\n"
-                                f"Query Params:\n{json.dumps(query_params, indent=2)}\n"
-                                f"Body:\n{json.dumps(body, indent=2)}")
-    
-    @blueprint.after_request
-    def log_response_info(response):
-        response_data = response.data
-        
-        if response.is_json:
-            sanitized_response = app.sanitizer.sanitize_dict(response.get_json())
-            response_data = json.dumps(sanitized_response, indent=2)
+        if g.log_payload:
+            body = request.get_data(cache=True) if request.is_json else b''
+            app.payload_log.log_request(request.method, request.path, request.args.to_dict(), body)
 
-        current_app.logger.info(f"\nResponse: {response.status_code}\nData:\n{response_data}")
+    def log_response_info(response):
+        if g.get('log_payload'):
+            # Streamed bodies can only be consumed once, by the client
+            if response.is_streamed:
+                app.payload_log.log_response(response.status_code, b'[streamed]', False)
+            else:
+                app.payload_log.log_response(response.status_code, response.get_data(), response.is_json)
 
         return response
-        
+
     app.register_blueprint(blueprint)
-    current_app.logger.info(f"Blueprint {blueprint.name} registered successfully.")
\ No newline at end of file
+
+    # Hooked onto the app for this blueprint's routes only. Blueprints are module level
+    # and shared by every app create_app() builds, so they must not be modified.
+    app.before_request_funcs.setdefault(blueprint.name, []).append(log_request_info)
+    app.after_request_funcs.setdefault(blueprint.name, []).append(log_response_info)
+
+    current_app.logger.info(f"Blueprint {blueprint.name} registered successfully.")
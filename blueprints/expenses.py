@@ -1,121 +1,369 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from model import Group, User, Expense, ExpenseSplit
+from sqlalchemy import insert, select
+from collections import defaultdict
+from model import Group, Expense, ExpenseSplit, group_membership
+from util.loader_profiles import EXPENSE_DETAIL, GROUP_HEADER
+from util.balances import apply_balance_deltas, split_deltas
+from util.pagination import InvalidCursor, get_limit, paginate
+from util.projection import InvalidProjection, Projection, EXPENSE_FIELDS
+from util.dto import expense_page
+from util.export import EXPORT_FORMATS, export_rows, stream_csv, stream_ndjson
+from util.group_versions import bump_group_version, bump_group_versions, make_etag, not_modified
+from util.sync import record_tombstones
+from util.pubsub import group_channel, group_event
 import datetime
+import time
 
 expenses_bp = Blueprint('expenses', __name__, url_prefix='/expenses')
 
+# Upper bound on expenses accepted by one bulk import request
+BULK_MAX_EXPENSES = 5000
+
+EXPENSE_FIELDS_REQUIRED = ('title', 'description', 'total_cost', 'payer_portion', 'splits')
+SPLIT_FIELDS_REQUIRED = ('user_id', 'amount_paid', 'amount_owed')
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Checks the shape of a payload's splits without touching the database, returning a message on failure
+def invalid_splits(splits):
+    if not isinstance(splits, list):
+        return "Invalid split data"
+
+    seen_user_ids = set()
+    for split in splits:
+        if not isinstance(split, dict) or not all(key in split for key in SPLIT_FIELDS_REQUIRED):
+            return "Invalid split data"
+
+        if not isinstance(split['user_id'], int) or isinstance(split['user_id'], bool):
+            return "Invalid split user"
+
+        if not is_number(split['amount_paid']) or not is_number(split['amount_owed']):
+            return "Invalid split amount"
+
+        if split['user_id'] in seen_user_ids:
+            return "Duplicate split user"
+        seen_user_ids.add(split['user_id'])
+
+    return None
+
+# Checks a payload's splits against the group's member ids, returning (message, status) on failure
+def validate_splits(splits, member_ids):
+    message = invalid_splits(splits)
+    if message:
+        return message, 400
+
+    if not {split['user_id'] for split in splits} <= set(member_ids):
+        return "One or more Split users are not a member of the group", 403
+
+    return None
+
 @expenses_bp.route('/', methods=['GET'])
 def get_expenses():
     group_id = request.args.get('group_id', type=int)
+    cursor = request.args.get('cursor', type=str)
+    limit = get_limit(request.args)
 
     if group_id is None:
         return jsonify({"message": "Group ID is required"}), 400
-    
+
+    # fields/depth shape the expenses; the group header keeps its fixed shape
+    try:
+        projection = Projection.from_args(EXPENSE_FIELDS, request.args)
+    except InvalidProjection as e:
+        return jsonify({"message": f"Invalid fields or depth: {e}"}), 400
+
+
     session = current_app.Session()
 
     try:
-        group = session.query(Group).filter_by(id=group_id).first()
+        version = session.scalar(select(Group.version).where(Group.id == group_id))
+
+        if version is None:
+            return jsonify({"message": "Group not found"}), 404
+
+        etag = make_etag(group_id, version)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        payload = current_app.snapshot_cache.get(group_id, request.full_path, version)
+        if payload is not None:
+            response = jsonify(payload)
+            response.set_etag(etag)
+            return response
+
+        group = session.query(Group).options(*GROUP_HEADER).filter_by(id=group_id).first()
 
         if group is None:
-            session.close()
             return jsonify({"message": "Group not found"}), 404
         
-        expenses = session.query(Expense).filter_by(group_id=group_id).all()
+        if projection:
+            query = session.query(Expense).options(*projection.load_options(Expense.date)).filter_by(group_id=group_id)
+            expenses, next_cursor = paginate(query, [Expense.date, Expense.id], cursor, limit)
+            expenses_list = [projection.serialize(expense) for expense in expenses]
+        else:
+            # The full shape is built as DTOs straight from rows
+            expenses_list, next_cursor = expense_page(session, group, cursor, limit)
         
-        group_dict = group.to_dict()
-        del group_dict['expenses']  # Remove expenses from group dict to avoid redundancy
-        expenses_list = [expense.to_dict() for expense in expenses]
+        group_dict = group.to_dict(include_expenses=False)
+    except InvalidCursor:
+        return jsonify({"message": "Invalid cursor"}), 400
     except Exception as e:
         current_app.logger.error(f"Error fetching expenses: {e}")
         return jsonify({"message": "Failed to fetch expenses", "error": f"{e}"}), 500
-    finally:
-        session.close()
 
-    return jsonify({"group": group_dict, "expenses": expenses_list})
+    payload = {"group": group_dict, "expenses": expenses_list, "next_cursor": next_cursor}
+    current_app.snapshot_cache.set(group_id, request.full_path, version, payload)
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+# Streams every expense in a group, so exports never build the whole list in memory
+@expenses_bp.route('/export', methods=['GET'])
+def export_expenses():
+    group_id = request.args.get('group_id', type=int)
+    export_format = request.args.get('format', 'csv', type=str)
+
+    if group_id is None:
+        return jsonify({"message": "Group ID is required"}), 400
+
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"message": f"Unsupported format, expected one of {sorted(EXPORT_FORMATS)}"}), 400
+
+    session = current_app.Session()
+
+    try:
+        if session.scalar(select(Group.id).where(Group.id == group_id)) is None:
+            return jsonify({"message": "Group not found"}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error exporting expenses: {e}")
+        return jsonify({"message": "Failed to export expenses", "error": f"{e}"}), 500
+
+    batches = export_rows(session, group_id)
+    if export_format == 'csv':
+        body = stream_csv(batches)
+    else:
+        body = stream_ndjson(batches, current_app.json.dumps)
+
+    # The request context (and so the session) stays open until the last chunk is sent
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=group-{group_id}-expenses.{export_format}"}
+    )
 
 @expenses_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_expense():
-    group_id = request.args.get('group_id')
+    group_id = request.args.get('group_id', type=int)
     data = request.get_json()
     requesting_user_id = int(get_jwt_identity())
 
     if group_id is None:
         return jsonify({"message": "Group ID is required"}), 400
     
-    if not data or not all([key in data for key in ('title', 'description', 'total_cost', 'payer_portion', 'splits')]):
+    if not data or not all([key in data for key in EXPENSE_FIELDS_REQUIRED]):
         return jsonify({"message": "Missing required fields"}), 400
+
+    try:
+        date = datetime.datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else datetime.date.today()
+    except (TypeError, ValueError):
+        return jsonify({"message": "Invalid date"}), 400
     
     session = current_app.Session()
 
     try:
-        group = session.query(Group).filter_by(id=group_id).first()
+        group = session.get(Group, group_id)
 
         if group is None:
-            session.close()
             return jsonify({"message": "Group not found"}), 404
-        
-        if requesting_user_id not in [member.id for member in group.members]:
-            session.close()
+
+        # One membership lookup validates the payer and every split up front
+        members = {member.id: member for member in group.members}
+
+        if requesting_user_id not in members:
             return jsonify({"message": "User not a member of the group"}), 403
-        
-        paid_by = session.query(User).filter_by(id=requesting_user_id).first()
 
-        if paid_by is None:
-            session.close()
-            return jsonify({"message": "Paid by user not found"}), 404
+        error = validate_splits(data['splits'], members.keys())
+        if error:
+            message, status = error
+            return jsonify({"message": message}), status
 
-        if data.get('date'):
-            data['date'] = datetime.datetime.strptime(data['date'], '%Y-%m-%d').date()
+        version = bump_group_version(session, group_id)
 
         new_expense = Expense(
             title=data['title'],
             description=data['description'],
-            date=data.get('date', datetime.date.today()),
+            date=date,
             totalCost=data['total_cost'],
-            paid_by_id=paid_by.id,
+            paid_by=members[requesting_user_id],
             payer_portion=data['payer_portion'],
-            group_id=group_id
+            group=group,
+            sync_version=version,
+            splits=[
+                ExpenseSplit(
+                    user_id=split['user_id'],
+                    user=members[split['user_id']],
+                    amount_paid=split['amount_paid'],
+                    amount_owed=split['amount_owed']
+                )
+                for split in data['splits']
+            ]
         )
-
         session.add(new_expense)
-        session.commit()
 
-        for split in data['splits']:
-            if 'user_id' not in split or 'amount_paid' not in split or 'amount_owed' not in split:
-                session.rollback()
-                session.delete(new_expense)
-                session.commit()
-                session.close()
-                return jsonify({"message": "Invalid split data"}), 400
-            
-            if split['user_id'] not in [member.id for member in group.members]:
-                session.rollback()
-                session.delete(new_expense)
-                session.commit()
-                session.close()
-                return jsonify({"message": "One or more Split users are not a member of the group"}), 403
-            
-            expense_split = ExpenseSplit(
-                user_id=split['user_id'],
-                expense_id=new_expense.id,
-                amount_paid=split['amount_paid'],
-                amount_owed=split['amount_owed']
-            )
-            session.add(expense_split)
+        # Flushes the expense, its splits and the ledger together
+        apply_balance_deltas(session, group_id, split_deltas(new_expense.splits))
 
         new_expense_dict = new_expense.to_dict()
         session.commit()
+        current_app.settle_cache.invalidate(group_id)
+        current_app.snapshot_cache.invalidate(group_id)
+        current_app.events.publish(
+            group_channel(group_id), group_event("expense.created", group_id, version, expense_id=new_expense_dict['id'])
+        )
     except Exception as e:
         current_app.logger.error(f"Error creating expense: {e}")
         session.rollback()
         return jsonify({"message": "Failed to create expense", "error": f"{e}"}), 500
-    finally:
-        session.close()
     
     return jsonify({"message": "Expense created successfully", "expense": new_expense_dict}), 201
 
+@expenses_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_expenses():
+    default_group_id = request.args.get('group_id', type=int)
+    data = request.get_json(silent=True)
+    requesting_user_id = int(get_jwt_identity())
+
+    if not data or not isinstance(data.get('expenses'), list) or not data['expenses']:
+        return jsonify({"message": "A non-empty expenses list is required"}), 400
+
+    items = data['expenses']
+    if len(items) > BULK_MAX_EXPENSES:
+        return jsonify({"message": f"At most {BULK_MAX_EXPENSES} expenses per request"}), 413
+
+    expense_rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all(key in item for key in EXPENSE_FIELDS_REQUIRED):
+            return jsonify({"message": f"Missing required fields in expense {index}"}), 400
+
+        group_id = item.get('group_id', default_group_id)
+        if group_id is None:
+            return jsonify({"message": f"Group ID is required for expense {index}"}), 400
+
+        if not isinstance(group_id, int) or isinstance(group_id, bool):
+            return jsonify({"message": f"Invalid group ID in expense {index}"}), 400
+
+        if not is_number(item['total_cost']) or not is_number(item['payer_portion']):
+            return jsonify({"message": f"Invalid amount in expense {index}"}), 400
+
+        # The ledger math below runs on every split, so bad rows are rejected before any query
+        message = invalid_splits(item['splits'])
+        if message:
+            return jsonify({"message": f"{message} in expense {index}"}), 400
+
+        try:
+            date = datetime.datetime.strptime(item['date'], '%Y-%m-%d').date() if item.get('date') else datetime.date.today()
+        except (TypeError, ValueError):
+            return jsonify({"message": f"Invalid date in expense {index}"}), 400
+
+        expense_rows.append({
+            "title": item['title'],
+            "description": item['description'],
+            "date": date,
+            "totalCost": item['total_cost'],
+            "paid_by_id": requesting_user_id,
+            "payer_portion": item['payer_portion'],
+            "group_id": group_id
+        })
+
+    session = current_app.Session()
+
+    try:
+        start = time.perf_counter()
+
+        # Membership of every referenced group in one query, validated once per group
+        group_ids = {row['group_id'] for row in expense_rows}
+        found_group_ids = set(session.scalars(select(Group.id).where(Group.id.in_(group_ids))))
+        if found_group_ids != group_ids:
+            return jsonify({"message": "Group not found", "group_ids": sorted(group_ids - found_group_ids)}), 404
+
+        members = defaultdict(set)
+        membership = select(group_membership.c.group_id, group_membership.c.user_id).where(
+            group_membership.c.group_id.in_(group_ids)
+        )
+        for group_id, user_id in session.execute(membership):
+            members[group_id].add(user_id)
+
+        for group_id in group_ids:
+            if requesting_user_id not in members[group_id]:
+                return jsonify({"message": "User not a member of the group", "group_id": group_id}), 403
+
+        for index, (item, row) in enumerate(zip(items, expense_rows)):
+            error = validate_splits(item['splits'], members[row['group_id']])
+            if error:
+                message, status = error
+                return jsonify({"message": f"{message} in expense {index}"}), status
+
+        versions = bump_group_versions(session, group_ids)
+        for row in expense_rows:
+            row['sync_version'] = versions[row['group_id']]
+
+        # Multi-row INSERT ... RETURNING, ids come back in payload order
+        expense_ids = session.scalars(
+            insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+            expense_rows
+        ).all()
+
+        split_rows = []
+        expense_counts = defaultdict(int)
+        balance_deltas = defaultdict(lambda: defaultdict(float))
+        for item, row, expense_id in zip(items, expense_rows, expense_ids):
+            expense_counts[row['group_id']] += 1
+            for split in item['splits']:
+                split_rows.append({
+                    "user_id": split['user_id'],
+                    "expense_id": expense_id,
+                    "amount_paid": split['amount_paid'],
+                    "amount_owed": split['amount_owed']
+                })
+                balance_deltas[row['group_id']][split['user_id']] += split['amount_paid'] - split['amount_owed']
+
+        if split_rows:
+            session.execute(insert(ExpenseSplit), split_rows)
+
+        for group_id, deltas in balance_deltas.items():
+            apply_balance_deltas(session, group_id, deltas)
+
+        session.commit()
+
+        for group_id in group_ids:
+            current_app.settle_cache.invalidate(group_id)
+            current_app.snapshot_cache.invalidate(group_id)
+            current_app.events.publish(
+                group_channel(group_id),
+                group_event("expense.imported", group_id, versions[group_id], count=expense_counts[group_id])
+            )
+
+        elapsed = time.perf_counter() - start
+        row_count = len(expense_ids) + len(split_rows)
+        current_app.logger.info(f"Bulk imported {len(expense_ids)} expenses and {len(split_rows)} splits "
+                                f"in {elapsed * 1000:.1f} ms ({row_count / max(elapsed, 1e-9):.0f} rows/sec)")
+    except Exception as e:
+        current_app.logger.error(f"Error bulk creating expenses: {e}")
+        session.rollback()
+        return jsonify({"message": "Failed to create expenses", "error": f"{e}"}), 500
+
+    return jsonify({
+        "message": "Expenses created successfully",
+        "expense_ids": expense_ids,
+        "split_count": len(split_rows)
+    }), 201
+
 @expenses_bp.route('/', methods=['PUT'])
 @jwt_required()
 def update_expense():
@@ -129,14 +377,12 @@ def update_expense():
     session = current_app.Session()
 
     try:
-        expense = session.query(Expense).filter_by(id=expense_id).first()
+        expense = session.query(Expense).options(*EXPENSE_DETAIL).filter_by(id=expense_id).first()
 
         if expense is None:
-            session.close()
             return jsonify({"message": "Expense not found"}), 404
         
         if expense.paid_by_id != requesting_user_id and expense.group.owner_id != requesting_user_id:
-            session.close()
             return jsonify({"message": "Unauthorized to update this expense"}), 403
         
         if 'date' in data:
@@ -151,7 +397,6 @@ def update_expense():
         for new_split in split_updates:
             if 'user_id' not in new_split:
                 session.rollback()
-                session.close()
                 return jsonify({"message": "Invalid split data"}), 400
             
             existing_split = session.query(ExpenseSplit).filter_by(
@@ -159,19 +404,30 @@ def update_expense():
             ).first()
 
             if existing_split:
+                old_net = existing_split.amount_paid - existing_split.amount_owed
+
                 if 'amount_paid' in new_split:
                     existing_split.amount_paid = new_split['amount_paid']
                 if 'amount_owed' in new_split:
                     existing_split.amount_owed = new_split['amount_owed']
 
+                new_net = existing_split.amount_paid - existing_split.amount_owed
+                apply_balance_deltas(session, expense.group_id, {existing_split.user_id: new_net - old_net})
+
+        version = bump_group_version(session, expense.group_id)
+        expense.sync_version = version
         expense_dict = expense.to_dict()
         session.commit()
+        current_app.settle_cache.invalidate(expense_dict['group_id'])
+        current_app.snapshot_cache.invalidate(expense_dict['group_id'])
+        current_app.events.publish(
+            group_channel(expense_dict['group_id']),
+            group_event("expense.updated", expense_dict['group_id'], version, expense_id=expense_id)
+        )
 
     except Exception as e:
         current_app.logger.error(f"Error updating expense: {e}")
         return jsonify({"message": "Failed to update expense", "error": f"{e}"}), 500
-    finally:
-        session.close()
 
     return jsonify({"message": "Expense updated successfully", "expense": expense_dict}), 200
 
@@ -191,19 +447,23 @@ def delete_expense():
         group = session.query(Group).filter_by(id=expense.group_id).first()
 
         if expense is None:
-            session.close()
             return jsonify({"message": "Expense not found"}), 404
         
         if expense.paid_by_id != requesting_user_id and group.owner_id != requesting_user_id:
-            session.close()
             return jsonify({"message": "Unauthorized to delete this expense"}), 403
 
+        apply_balance_deltas(session, expense.group_id, split_deltas(expense.splits, sign=-1))
+        version = bump_group_version(session, group.id)
+        record_tombstones(session, group.id, version, "expense", [expense.id])
         session.delete(expense)
         session.commit()
+        current_app.settle_cache.invalidate(group.id)
+        current_app.snapshot_cache.invalidate(group.id)
+        current_app.events.publish(
+            group_channel(group.id), group_event("expense.deleted", group.id, version, expense_id=expense_id)
+        )
     except Exception as e:
         current_app.logger.error(f"Error deleting expense: {e}")
         return jsonify({"message": "Failed to delete expense", "error": f"{e}"}), 500
-    finally:
-        session.close()
 
     return jsonify({"message": "Expense deleted successfully"}), 200
\ No newline at end of file
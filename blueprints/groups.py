@@ -1,6 +1,16 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from model import Group, User, group_membership
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from model import Group, GroupBalance, User, group_membership
+from util.loader_profiles import GROUP_SNAPSHOT
+from util.pagination import InvalidCursor, get_limit, paginate
+from util.projection import InvalidProjection, Projection, GROUP_FIELDS
+from util.group_versions import bump_group_version, make_etag, not_modified
+from util.sync import changes_since, decode_sync_token, record_tombstones, touch_members
+from util.pubsub import group_channel, group_event
+from util.summary import SUMMARY_GROUPINGS, group_summary
+import datetime
 
 groups_bp = Blueprint('groups', __name__, url_prefix='/groups')
 
@@ -8,42 +18,270 @@ groups_bp = Blueprint('groups', __name__, url_prefix='/groups')
 def get_groups():
     group_id = request.args.get('group_id', type=int)
     user_id = request.args.get('user_id', type=int)
+    cursor = request.args.get('cursor', type=str)
+    limit = get_limit(request.args)
+
+    try:
+        projection = Projection.from_args(GROUP_FIELDS, request.args)
+    except InvalidProjection as e:
+        return jsonify({"message": f"Invalid fields or depth: {e}"}), 400
+
+    load_options = projection.load_options() if projection else GROUP_SNAPSHOT
+    serialize = projection.serialize if projection else Group.to_dict
     session = current_app.Session()
 
     if group_id is not None:
         try:
-            group = session.query(Group).filter_by(id=group_id).first()
-            if group is None:
+            version = session.scalar(select(Group.version).where(Group.id == group_id))
+            if version is None:
                 return jsonify({"message": "Group not found"}), 404
-            group_dict = group.to_dict()
+
+            etag = make_etag(group_id, version)
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
+
+            group_dict = current_app.snapshot_cache.get(group_id, request.full_path, version)
+            if group_dict is None:
+                group = session.query(Group).options(*load_options).filter_by(id=group_id).first()
+                if group is None:
+                    return jsonify({"message": "Group not found"}), 404
+                group_dict = serialize(group)
+                current_app.snapshot_cache.set(group_id, request.full_path, version, group_dict)
         except Exception as e:
             current_app.logger.error(f"Error fetching group: {e}")
             return jsonify({"message": "Failed to fetch group", "error": f"{e}"}), 500
-        finally:
-            session.close()
-        return jsonify({"groups": [group_dict]})
+        response = jsonify({"groups": [group_dict]})
+        response.set_etag(etag)
+        return response
     elif user_id is not None:
         try:
             user = session.query(User).filter_by(id=user_id).first()
             if user is None:
                 return jsonify({"message": "User not found"}), 404
-            groups_list = [group.to_dict() for group in user.groups]
+
+            # Joining or leaving a group changes the id list, any write changes a version
+            versions = session.execute(
+                select(Group.id, Group.version)
+                .join(group_membership, group_membership.c.group_id == Group.id)
+                .where(group_membership.c.user_id == user_id)
+                .order_by(Group.id)
+            ).all()
+            etag = make_etag(user_id, [tuple(row) for row in versions])
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
+
+            query = (
+                session.query(Group)
+                .join(group_membership, group_membership.c.group_id == Group.id)
+                .filter(group_membership.c.user_id == user_id)
+                .options(*load_options)
+            )
+            groups, next_cursor = paginate(query, [Group.id], cursor, limit)
+            groups_list = [serialize(group) for group in groups]
+        except InvalidCursor:
+            return jsonify({"message": "Invalid cursor"}), 400
         except Exception as e:
             current_app.logger.error(f"Error fetching groups for user: {e}")
             return jsonify({"message": "Failed to fetch groups", "error": f"{e}"}), 500
-        finally:
-            session.close()
-        return jsonify({"groups": groups_list})
+        response = jsonify({"groups": groups_list, "next_cursor": next_cursor})
+        response.set_etag(etag)
+        return response
     else:
         try:
-            groups = session.query(Group).all()
-            groups_list = [group.to_dict() for group in groups]
+            groups, next_cursor = paginate(session.query(Group).options(*load_options), [Group.id], cursor, limit)
+            groups_list = [serialize(group) for group in groups]
+        except InvalidCursor:
+            return jsonify({"message": "Invalid cursor"}), 400
         except Exception as e:
             current_app.logger.error(f"Error fetching groups: {e}")
             return jsonify({"message": "Failed to fetch groups", "error": f"{e}"}), 500
+        return jsonify({"groups": groups_list, "next_cursor": next_cursor})
+
+@groups_bp.route('/balances', methods=['GET'])
+def get_balances():
+    group_id = request.args.get('group_id', type=int)
+
+    if group_id is None:
+        return jsonify({"message": "Group ID is required"}), 400
+
+    session = current_app.Session()
+
+    try:
+        group = session.get(Group, group_id)
+        if group is None:
+            return jsonify({"message": "Group not found"}), 404
+
+        ledger = (
+            session.query(GroupBalance)
+            .options(joinedload(GroupBalance.user))
+            .filter_by(group_id=group_id)
+            .all()
+        )
+        balances = {entry.user_id: entry.to_dict() for entry in ledger}
+
+        # Members without any splits yet are settled
+        members = session.query(User).join(group_membership, group_membership.c.user_id == User.id).filter(
+            group_membership.c.group_id == group_id
+        ).all()
+        for member in members:
+            if member.id not in balances:
+                balances[member.id] = GroupBalance(group_id=group_id, user_id=member.id, balance=0.0, user=member).to_dict()
+    except Exception as e:
+        current_app.logger.error(f"Error fetching balances: {e}")
+        return jsonify({"message": "Failed to fetch balances", "error": f"{e}"}), 500
+    return jsonify({"group_id": group_id, "balances": list(balances.values())})
+
+@groups_bp.route('/settle', methods=['GET'])
+def get_settlement():
+    group_id = request.args.get('group_id', type=int)
+
+    if group_id is None:
+        return jsonify({"message": "Group ID is required"}), 400
+
+    session = current_app.Session()
+
+    try:
+        group = session.get(Group, group_id)
+        if group is None:
+            return jsonify({"message": "Group not found"}), 404
+
+        balances = dict(
+            session.query(GroupBalance.user_id, GroupBalance.balance).filter_by(group_id=group_id).all()
+        )
+        settlement = current_app.settle_cache.get(group_id, balances)
+    except Exception as e:
+        current_app.logger.error(f"Error settling group: {e}")
+        return jsonify({"message": "Failed to settle group", "error": f"{e}"}), 500
+    return jsonify({"group_id": group_id, **settlement})
+
+# Spending totals for charts, aggregated in SQL instead of shipping every expense.
+# by=month adds per-month totals, by=payer totals per payer; members are always included.
+@groups_bp.route('/summary', methods=['GET'])
+def get_summary():
+    group_id = request.args.get('group_id', type=int)
+    by = request.args.get('by', 'month', type=str)
+
+    if group_id is None:
+        return jsonify({"message": "Group ID is required"}), 400
+
+    if by not in SUMMARY_GROUPINGS:
+        return jsonify({"message": f"by must be one of: {', '.join(SUMMARY_GROUPINGS)}"}), 400
+
+    try:
+        start, end = (
+            datetime.datetime.strptime(request.args[key], '%Y-%m-%d').date() if request.args.get(key) else None
+            for key in ('from', 'to')
+        )
+    except ValueError:
+        return jsonify({"message": "Invalid date"}), 400
+
+    session = current_app.Session()
+
+    try:
+        version = session.scalar(select(Group.version).where(Group.id == group_id))
+        if version is None:
+            return jsonify({"message": "Group not found"}), 404
+
+        etag = make_etag(group_id, version)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        summary = current_app.snapshot_cache.get(group_id, request.full_path, version)
+        if summary is None:
+            summary = {
+                "group_id": group_id,
+                "from": start.isoformat() if start else None,
+                "to": end.isoformat() if end else None,
+                "by": by,
+                **group_summary(session, group_id, start, end, by)
+            }
+            current_app.snapshot_cache.set(group_id, request.full_path, version, summary)
+    except Exception as e:
+        current_app.logger.error(f"Error summarizing group: {e}")
+        return jsonify({"message": "Failed to summarize group", "error": f"{e}"}), 500
+
+    response = jsonify(summary)
+    response.set_etag(etag)
+    return response
+
+# Delta sync: everything that changed in a group since the client's sync token
+@groups_bp.route('/changes', methods=['GET'])
+def get_changes():
+    group_id = request.args.get('group_id', type=int)
+
+    if group_id is None:
+        return jsonify({"message": "Group ID is required"}), 400
+
+    try:
+        since = decode_sync_token(request.args.get('since', type=str))
+    except InvalidCursor:
+        return jsonify({"message": "Invalid sync token"}), 400
+
+    session = current_app.Session()
+
+    try:
+        group = session.get(Group, group_id)
+        if group is None:
+            return jsonify({"message": "Group not found"}), 404
+
+        changes = changes_since(session, group, since)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching group changes: {e}")
+        return jsonify({"message": "Failed to fetch group changes", "error": f"{e}"}), 500
+
+    return jsonify({"group_id": group_id, **changes})
+
+# Server-Sent Events for one group's writes. Events carry a sync token for
+# GET /groups/changes; a "resync" event means events were dropped for this client.
+@groups_bp.route('/stream', methods=['GET'])
+def stream_group_events():
+    group_id = request.args.get('group_id', type=int)
+
+    if group_id is None:
+        return jsonify({"message": "Group ID is required"}), 400
+
+    session = current_app.Session()
+
+    try:
+        if session.get(Group, group_id) is None:
+            return jsonify({"message": "Group not found"}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error opening group stream: {e}")
+        return jsonify({"message": "Failed to open group stream", "error": f"{e}"}), 500
+
+    # Not wrapped in stream_with_context: the session goes back to the pool when the
+    # request context ends, so idle subscribers do not hold database connections
+    subscription = current_app.events.subscribe(group_channel(group_id))
+    dumps = current_app.json.dumps
+    # Seconds between keepalive comments on an idle stream
+    heartbeat_seconds = float(current_app.settings.get('EVENTS_HEARTBEAT_SECONDS', 15))
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+
+            while True:
+                event = subscription.get(timeout=heartbeat_seconds)
+
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield f"event: resync\ndata: {dumps({'group_id': group_id})}\n\n"
+
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {dumps(event)}\n\n"
         finally:
-            session.close()
-        return jsonify({"groups": groups_list})
+            subscription.close()
+
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @groups_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -72,8 +310,6 @@ def create_group():
     except Exception as e:
         current_app.logger.error(f"Error creating group: {e}")
         return jsonify({"message": "Failed to create group", "error": f"{e}"}), 500
-    finally:
-        session.close()
     return jsonify({"message": "Group created successfully", "group": group_dict}), 201
 
 @groups_bp.route('/', methods=['PUT'])
@@ -95,15 +331,17 @@ def update_group():
             return jsonify({"message": "Unauthorized to update this group"}), 403
 
         for key, value in data.items():
-            if hasattr(group, key) and key not in ('id', 'owner_id', 'expenses', 'members'):
+            if hasattr(group, key) and key not in ('id', 'owner_id', 'expenses', 'members', 'member_count', 'version'):
                 setattr(group, key, value)
+        version = bump_group_version(session, group_id)
         session.commit()
+        current_app.snapshot_cache.invalidate(group_id)
+        current_app.events.publish(group_channel(group_id), group_event("group.updated", group_id, version))
+        group = session.query(Group).options(*GROUP_SNAPSHOT).populate_existing().filter_by(id=group_id).one()
         group_dict = group.to_dict()
     except Exception as e:
         current_app.logger.error(f"Error updating group: {e}")
         return jsonify({"message": "Failed to update group", "error": f"{e}"}), 500
-    finally:
-        session.close()
     return jsonify({"message": "Group updated successfully", "group": group_dict}), 200
 
 @groups_bp.route('/', methods=['DELETE'])
@@ -125,11 +363,11 @@ def delete_group():
 
         session.delete(group)
         session.commit()
+        current_app.snapshot_cache.invalidate(group_id)
+        current_app.events.publish(group_channel(group_id), group_event("group.deleted", group_id))
     except Exception as e:
         current_app.logger.error(f"Error deleting group: {e}")
         return jsonify({"message": "Failed to delete group", "error": f"{e}"}), 500
-    finally:
-        session.close()
     return jsonify({"message": "Group deleted successfully"}), 200
 
 @groups_bp.route("/members", methods=["POST"])
@@ -150,20 +388,22 @@ def add_member():
             return jsonify({"message": "You don't own this group"}), 403
     
         if not group or not user:
-            session.close()
             return jsonify({"message": "User or group not found"}), 404
 
         if user in group.members:
-            session.close()
             return jsonify({"message": "User is already a member"}), 400
 
         group.members.append(user)
+        version = bump_group_version(session, group_id)
+        touch_members(session, group_id, [user.id], version)
         session.commit()
+        current_app.snapshot_cache.invalidate(group_id)
+        current_app.events.publish(
+            group_channel(group_id), group_event("member.added", group_id, version, user_id=user.id)
+        )
     except Exception as e:
         current_app.logger.error(f"Error adding member to group: {e}")
         return jsonify({"message": "Failed to add member to group", "error": f"{e}"}), 500
-    finally:
-        session.close()
 
     return jsonify({"message": "User added to group"})
 
@@ -185,23 +425,24 @@ def remove_member():
             return jsonify({"message": "You don't own this group"}), 403
     
         if not group or not user:
-            session.close()
             return jsonify({"message": "User or group not found"}), 404
 
         if user not in group.members:
-            session.close()
             return jsonify({"message": "User is not a member"}), 400
 
         if user_id == group.owner_id:
-            session.close()
             return jsonify({"message": "Cannot remove the group owner"}), 400
         
         group.members.remove(user)
+        version = bump_group_version(session, group_id)
+        record_tombstones(session, group_id, version, "member", [user.id])
         session.commit()
+        current_app.snapshot_cache.invalidate(group_id)
+        current_app.events.publish(
+            group_channel(group_id), group_event("member.removed", group_id, version, user_id=user.id)
+        )
     except Exception as e:
         current_app.logger.error(f"Error removing member from group: {e}")
         return jsonify({"message": "Failed to remove member from group", "error": f"{e}"}), 500
-    finally:
-        session.close()
 
     return jsonify({"message": "User removed from group"})
@@ -1,57 +1,140 @@
 from flask import Blueprint, jsonify, request, current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
-from model import User
+from sqlalchemy import String, bindparam, func, select
+from model import User, username_search_key
+from util.pagination import InvalidCursor, get_limit, paginate
+from util.projection import InvalidProjection, Projection, USER_FIELDS
+from util.passwords import HasherOverloaded
+from util.group_versions import bump_group_versions, make_etag, not_modified, user_group_ids, user_group_versions
+from util.sync import record_tombstones, touch_user_rows
+from util.balances import BALANCE_TOLERANCE, user_balances
+import sys
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 
+# User fields that appear in group snapshots and sync payloads
+SNAPSHOT_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+# Smallest string greater than every string starting with prefix, or None if there is
+# none (the prefix is all U+10FFFF). Surrogate code points cannot be encoded, so skip them.
+def prefix_upper_bound(prefix):
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return None
+
+    next_code_point = ord(stripped[-1]) + 1
+    if 0xD800 <= next_code_point <= 0xDFFF:
+        next_code_point = 0xE000
+    return stripped[:-1] + chr(next_code_point)
+
+# Narrows query to usernames starting with username, case-insensitively, and returns it
+# with the ordering columns. The prefix and the cursor values are lowered by the database,
+# like the index: SQLite's lower() only folds ASCII, so str.lower() would miss "Émile".
+def username_prefix_search(session, query, username):
+    search_key = username_search_key(session.get_bind().dialect.name)
+
+    if username:
+        prefix = session.scalar(select(func.lower(bindparam('prefix', username, type_=String))))
+        query = query.filter(search_key >= prefix)
+        upper_bound = prefix_upper_bound(prefix)
+        if upper_bound is not None:
+            query = query.filter(search_key < upper_bound)
+
+    # Rows of (user, lowered username), the latter feeding the next cursor
+    return query.add_columns(search_key), [search_key, User.id]
+
 @users_bp.route('/', methods=['GET'])
 def get_users():
     user_id = request.args.get('user_id', type=int)
     username = request.args.get('username', type=str)
-    limit = request.args.get('limit', default=20, type=int)
+    cursor = request.args.get('cursor', type=str)
+    limit = get_limit(request.args)
+
+    try:
+        projection = Projection.from_args(USER_FIELDS, request.args)
+    except InvalidProjection as e:
+        return jsonify({"message": f"Invalid fields or depth: {e}"}), 400
+
+    # The username search paginates on username, so it is always loaded
+    load_options = projection.load_options(User.username) if projection else ()
+    serialize = projection.serialize if projection else User.to_dict
     session = current_app.Session()
 
     if user_id is not None:
         try:
-            user = session.query(User).filter_by(id=user_id).first()
+            user = session.query(User).options(*load_options).filter_by(id=user_id).first()
 
             if user is None:
-                session.close()
                 return jsonify({"message": "User not found"}), 404
             
-            user_dict = user.to_dict()
+            user_dict = serialize(user)
         except Exception as e:
             current_app.logger.error(f"Error fetching user: {e}")
-            session.close()
             return jsonify({"message": "Failed to fetch user", "error": f"{e}"}), 500
-        finally:
-            session.close()
 
         return jsonify({"users": [user_dict]})
     elif username is not None:
         try:
-            users = session.query(User).filter(User.username.ilike(f"{username}%")).all()
-            users_list = [user.to_dict() for user in users]
+            # A range on the lowered username is an index seek, unlike ILIKE
+            query, columns = username_prefix_search(session, session.query(User).options(*load_options), username)
+            rows, next_cursor = paginate(
+                query, columns, cursor, limit,
+                cursor_values=lambda row: [row[1], row[0].id]
+            )
+            users_list = [serialize(user) for user, _ in rows]
+        except InvalidCursor:
+            return jsonify({"message": "Invalid cursor"}), 400
         except Exception as e:
             current_app.logger.error(f"Error searching users by username: {e}")
             return jsonify({"message": "Failed to search users", "error": f"{e}"}), 500
-        finally:
-            session.close()
 
-        return jsonify({"users": users_list[:limit]})
+        return jsonify({"users": users_list, "next_cursor": next_cursor})
     else:
         try:
-            users = session.query(User).all()
-            users_list = [user.to_dict() for user in users]
+            users, next_cursor = paginate(session.query(User).options(*load_options), [User.id], cursor, limit)
+            users_list = [serialize(user) for user in users]
+        except InvalidCursor:
+            return jsonify({"message": "Invalid cursor"}), 400
         except Exception as e:
             current_app.logger.error(f"Error fetching users: {e}")
             return jsonify({"message": "Failed to fetch users", "error": f"{e}"}), 500
-        finally:
-            session.close()
 
-        return jsonify({"users": users_list[:limit]})
+        return jsonify({"users": users_list, "next_cursor": next_cursor})
     
+# The requesting user's net position in each of their groups, for the home screen.
+# Positive balances are owed to the user, negative ones are owed by them.
+@users_bp.route('/balances', methods=['GET'])
+@jwt_required()
+def get_user_balances():
+    user_id = int(get_jwt_identity())
+    session = current_app.Session()
+
+    try:
+        # Every write that moves a balance bumps its group's version, so the aggregate
+        # only runs when the client's copy is out of date
+        etag = make_etag(user_id, user_group_versions(session, user_id))
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+
+        groups = user_balances(session, user_id)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching user balances: {e}")
+        return jsonify({"message": "Failed to fetch balances", "error": f"{e}"}), 500
+
+    owed_to_user = sum((group["balance"] for group in groups if group["balance"] > BALANCE_TOLERANCE), 0.0)
+    owed_by_user = -sum((group["balance"] for group in groups if group["balance"] < -BALANCE_TOLERANCE), 0.0)
+
+    response = jsonify({
+        "user_id": user_id,
+        "groups": groups,
+        "owed_to_user": owed_to_user,
+        "owed_by_user": owed_by_user,
+        "net": owed_to_user - owed_by_user
+    })
+    response.set_etag(etag)
+    return response
+
 @users_bp.route('/', methods=['POST'])
 def create_user():
     data = request.get_json()
@@ -59,8 +142,11 @@ def create_user():
     if not data or not all(key in data for key in ('username', 'password', 'first_name', 'last_name')):
         return jsonify({"message": "Missing required fields"}), 400
     
-    hashed_password = generate_password_hash(data['password'])
-    data['password'] = hashed_password
+    try:
+        data['password'] = current_app.password_hasher.hash(data['password'])
+    except HasherOverloaded as e:
+        current_app.logger.warning(f"Password hashing overloaded: {e}")
+        return jsonify({"message": "Server busy, try again shortly"}), 503, {"Retry-After": "1"}
 
     new_user = User(
         username=data['username'],
@@ -77,8 +163,6 @@ def create_user():
     except Exception as e:
         current_app.logger.error(f"Error creating user: {e}")
         return jsonify({"message": "Failed to create user", "error": f"{e}"}), 500
-    finally:
-        session.close()
 
     return jsonify({"message": "User created successfully", "user": new_user_dict}), 201
 
@@ -100,24 +184,34 @@ def update_user():
         user = session.query(User).filter_by(id=user_id).first()
 
         if user is None:
-            session.close()
             return jsonify({"message": "User not found"}), 404
         
         # Hash the password if it is provided
         if 'password' in data:
-            data['password'] = generate_password_hash(data['password'])
+            data['password'] = current_app.password_hasher.hash(data['password'])
+
+        shown = {key: getattr(user, key) for key in SNAPSHOT_USER_FIELDS}
 
         for key, value in data.items():
             if hasattr(user, key) and key != 'user_id':
                 setattr(user, key, value)
 
+        # Names are embedded in every snapshot of the user's groups; a password change is not
+        group_ids = []
+        if any(getattr(user, key) != value for key, value in shown.items()):
+            group_ids = user_group_ids(session, user_id)
+            bump_group_versions(session, group_ids)
+            touch_user_rows(session, user_id)
+
         user_dict = user.to_dict()
         session.commit()
+        current_app.snapshot_cache.invalidate_many(group_ids)
+    except HasherOverloaded as e:
+        current_app.logger.warning(f"Password hashing overloaded: {e}")
+        return jsonify({"message": "Server busy, try again shortly"}), 503, {"Retry-After": "1"}
     except Exception as e:
         current_app.logger.error(f"Error updating user: {e}")
         return jsonify({"message": "Failed to update user", "error": f"{e}"}), 500
-    finally:
-        session.close()
     
     return jsonify({"message": "User updated successfully", "user": user_dict}), 200
 
@@ -138,16 +232,20 @@ def delete_user():
         user = session.query(User).filter_by(id=user_id).first()
 
         if user is None:
-            session.close()
             return jsonify({"message": "User not found"}), 404
         
+        group_ids = user_group_ids(session, user_id)
+        versions = bump_group_versions(session, group_ids)
+        # Expenses keep their rows with the user nulled out, memberships go away
+        touch_user_rows(session, user_id)
+        for group_id, version in versions.items():
+            record_tombstones(session, group_id, version, "member", [user_id])
         session.delete(user)
         session.commit()
+        current_app.snapshot_cache.invalidate_many(group_ids)
     except Exception as e:
         current_app.logger.error(f"Error deleting user: {e}")
         return jsonify({"message": "Failed to delete user", "error": f"{e}"}), 500
-    finally:
-        session.close()
     
     # Placeholder for deleting a user
     return jsonify({"message": "User deleted successfully"}), 200
@@ -162,11 +260,26 @@ def login():
     session = current_app.Session()
     user = session.query(User).filter_by(username=data['username']).first()
     user_dict = user.to_dict() if user else None
+    hasher = current_app.password_hasher
+
+    try:
+        verified = user is not None and hasher.verify(user.password, data['password'])
+    except HasherOverloaded as e:
+        current_app.logger.warning(f"Password hashing overloaded: {e}")
+        return jsonify({"message": "Server busy, try again shortly"}), 503, {"Retry-After": "1"}
+
+    # Upgrade hashes made with old parameters while the plaintext is at hand. The login
+    # does not depend on it: a failed upgrade is retried on the next login.
+    try:
+        if verified and hasher.needs_rehash(user.password):
+            user.password = hasher.hash(data['password'])
+            session.commit()
+    except Exception as e:
+        current_app.logger.error(f"Error rehashing password for user {user_dict['id']}: {e}")
+        session.rollback()
 
-    if user and check_password_hash(user.password, data['password']):
-        access_token = create_access_token(identity=str(user.id))
-        session.close()
+    if verified:
+        access_token = create_access_token(identity=str(user_dict['id']))
         return jsonify({"access_token": access_token, "user": user_dict}), 200
     else:
-        session.close()
         return jsonify({"message": "Invalid username or password"}), 401
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+from logging.config import fileConfig
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, pool
+from model import Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+load_dotenv()
+
+target_metadata = Base.metadata
+
+def get_url():
+    url = os.getenv('DATABASE_URL') or config.get_main_option('sqlalchemy.url')
+    if not url:
+        raise ValueError("DATABASE_URL must be set in the environment variables.")
+    return url
+
+def run_migrations_offline():
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"}
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # Callers that already hold a connection (e.g. test setup) pass it in config.attributes
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        return run_with_connection(connection)
+
+    engine = create_engine(get_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        run_with_connection(connection)
+
+def run_with_connection(connection):
+    # SQLite cannot ALTER most constraints in place; batch mode rebuilds the table
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == 'sqlite'
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
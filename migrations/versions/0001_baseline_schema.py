@@ -0,0 +1,84 @@
+"""Baseline schema, as previously created by Base.metadata.create_all
+
+Databases that were created by the app before migrations existed already have these
+tables: run `alembic stamp 0001_baseline` once, then `alembic upgrade head`.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-16 23:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_baseline'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('username', sa.String(length=30), nullable=False),
+        sa.Column('password', sa.String(length=255), nullable=False),
+        sa.Column('first_name', sa.String(length=30), nullable=False),
+        sa.Column('last_name', sa.String(length=30), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table(
+        'group',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=30), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'expense',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('title', sa.String(length=30), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('totalCost', sa.Float(), nullable=False),
+        sa.Column('paid_by_id', sa.Integer(), nullable=True),
+        sa.Column('payer_portion', sa.Float(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['paid_by_id'], ['user.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'group_membership',
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+    op.create_table(
+        'expense_split',
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('expense_id', sa.Integer(), nullable=False),
+        sa.Column('amount_paid', sa.Float(), nullable=False),
+        sa.Column('amount_owed', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['expense_id'], ['expense.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('user_id', 'expense_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('expense_split')
+    op.drop_table('group_membership')
+    op.drop_table('expense')
+    op.drop_table('group')
+    op.drop_table('user')
@@ -0,0 +1,96 @@
+"""Balance ledger, username search index, group versions and delta sync tracking
+
+Revision ID: 0002_ledger_versions_sync
+Revises: 0001_baseline
+Create Date: 2026-10-16 23:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_ledger_versions_sync'
+down_revision: Union[str, Sequence[str], None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'group_balance',
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('balance', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+    # Same sums as `flask rebuild-balances`
+    op.execute(
+        'INSERT INTO group_balance (group_id, user_id, balance) '
+        'SELECT expense.group_id, expense_split.user_id, SUM(expense_split.amount_paid - expense_split.amount_owed) '
+        'FROM expense_split JOIN expense ON expense.id = expense_split.expense_id '
+        'WHERE expense_split.user_id IS NOT NULL '
+        'GROUP BY expense.group_id, expense_split.user_id'
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username) COLLATE "C"'), 'id'])
+
+    with op.batch_alter_table('group') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    with op.batch_alter_table('group_membership') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        batch_op.add_column(sa.Column('sync_version', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('expense') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        batch_op.add_column(sa.Column('sync_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_expense_group_sync_version', ['group_id', 'sync_version'])
+
+    with op.batch_alter_table('expense_split') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+    op.create_table(
+        'tombstone',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=16), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('sync_version', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstone_group_sync_version', 'tombstone', ['group_id', 'sync_version'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tombstone_group_sync_version', table_name='tombstone')
+    op.drop_table('tombstone')
+
+    with op.batch_alter_table('expense_split') as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('expense') as batch_op:
+        batch_op.drop_index('ix_expense_group_sync_version')
+        batch_op.drop_column('sync_version')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('group_membership') as batch_op:
+        batch_op.drop_column('sync_version')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('group') as batch_op:
+        batch_op.drop_column('version')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_user_username_lower', table_name='user')
+
+    op.drop_table('group_balance')
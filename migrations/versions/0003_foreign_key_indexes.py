@@ -0,0 +1,48 @@
+"""Indexes for foreign keys not led by a primary key, and username search on SQLite
+
+Revision ID: 0003_foreign_key_indexes
+Revises: 0002_ledger_versions_sync
+Create Date: 2026-10-16 23:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_foreign_key_indexes'
+down_revision: Union[str, Sequence[str], None] = '0002_ledger_versions_sync'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ('ix_expense_group_date', 'expense', ['group_id', 'date', 'id']),
+    ('ix_expense_paid_by_id', 'expense', ['paid_by_id']),
+    ('ix_expense_split_expense_id', 'expense_split', ['expense_id']),
+    ('ix_group_owner_id', 'group', ['owner_id']),
+    ('ix_group_membership_user_id', 'group_membership', ['user_id']),
+    ('ix_group_balance_user_id', 'group_balance', ['user_id']),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # On a large live PostgreSQL database, create these CONCURRENTLY by hand first;
+    # IF NOT EXISTS then makes this revision a no-op
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+    # PostgreSQL got its collated variant in 0002
+    if op.get_bind().dialect.name == 'sqlite':
+        op.create_index('ix_user_username_lower_sqlite', 'user', [sa.text('lower(username)'), 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        op.drop_index('ix_user_username_lower_sqlite', table_name='user')
+
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -1,21 +1,33 @@
 from typing import List
-from sqlalchemy import String, Date
+from sqlalchemy import String, Date, DateTime
 from sqlalchemy import ForeignKey
-from sqlalchemy import Table, Column
+from sqlalchemy import Table, Column, Index, Integer
+from sqlalchemy import func, select
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property
 import datetime
 
 class Base(DeclarativeBase):
     pass
 
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+# sync_version columns hold the group version of the write that last touched the row,
+# so GET /groups/changes can select everything newer than a client's sync token
+
 group_membership = Table(
     "group_membership",
     Base.metadata,
     Column("group_id", ForeignKey("group.id", ondelete="CASCADE"), primary_key=True),
     Column("user_id", ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("updated_at", DateTime, nullable=False, default=utcnow, onupdate=utcnow, server_default=func.now()),
+    Column("sync_version", Integer, nullable=False, default=0, server_default="0"),
+    # The primary key covers group_id lookups; user.groups and user deletes need user_id
+    Index("ix_group_membership_user_id", "user_id"),
 )
 
 class User(Base):
@@ -42,6 +54,17 @@ class User(Base):
             "last_name": self.last_name
         }
 
+# Case-insensitive username prefix search seeks on lower(username). PostgreSQL needs the
+# bytewise "C" collation for the btree to serve prefix ranges and the ORDER BY.
+Index(
+    "ix_user_username_lower", func.lower(User.username).collate("C"), User.id
+).ddl_if(dialect="postgresql")
+Index("ix_user_username_lower_sqlite", func.lower(User.username), User.id).ddl_if(dialect="sqlite")
+
+def username_search_key(dialect_name):
+    key = func.lower(User.username)
+    return key.collate("C") if dialect_name == "postgresql" else key
+
 class Expense(Base):
     __tablename__ = "expense"
 
@@ -51,10 +74,14 @@ class Expense(Base):
     date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
     totalCost: Mapped[float] = mapped_column(nullable=False)
     paid_by_id: Mapped[int] = mapped_column(
-        ForeignKey("user.id", ondelete="SET NULL"), nullable=True
+        ForeignKey("user.id", ondelete="SET NULL"), nullable=True, index=True
     )
     payer_portion: Mapped[float] = mapped_column(nullable=False)
     group_id: Mapped[int] = mapped_column(ForeignKey("group.id", ondelete="CASCADE"), nullable=False)
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False, default=utcnow, onupdate=utcnow, server_default=func.now()
+    )
+    sync_version: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
 
     paid_by: Mapped["User"] = relationship()
     group: Mapped["Group"] = relationship(back_populates="expenses")
@@ -64,6 +91,12 @@ class Expense(Base):
         passive_deletes=True
     )
 
+    __table_args__ = (
+        # Serves the group_id foreign key and the (date, id) keyset order of group listings
+        Index("ix_expense_group_date", "group_id", "date", "id"),
+        Index("ix_expense_group_sync_version", "group_id", "sync_version"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -84,9 +117,15 @@ class ExpenseSplit(Base):
     user_id: Mapped[int] = mapped_column(
         ForeignKey("user.id", ondelete="SET NULL"), primary_key=True, nullable=True
     )
-    expense_id: Mapped[int] = mapped_column(ForeignKey("expense.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    # user_id leads the primary key, so only expense_id needs its own index
+    expense_id: Mapped[int] = mapped_column(
+        ForeignKey("expense.id", ondelete="CASCADE"), primary_key=True, nullable=False, index=True
+    )
     amount_paid: Mapped[float] = mapped_column(nullable=False)
     amount_owed: Mapped[float] = mapped_column(nullable=False)
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False, default=utcnow, onupdate=utcnow, server_default=func.now()
+    )
 
     user: Mapped["User"] = relationship()
     expense: Mapped["Expense"] = relationship(back_populates="splits")
@@ -103,7 +142,9 @@ class Group(Base):
     __tablename__ = "group"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(30), nullable=False)
-    owner_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Bumped by every write that changes the group's snapshot; feeds ETags
+    version: Mapped[int] = mapped_column(nullable=False, default=1, server_default="1")
     
     owner: Mapped["User"] = relationship(passive_deletes=True)
     members: Mapped[List["User"]] = relationship(
@@ -117,12 +158,58 @@ class Group(Base):
         passive_deletes=True
     )
 
-    def to_dict(self):
-        return {
+    # Only loaded on request (undefer), e.g. by list screens that skip the member list
+    member_count: Mapped[int] = column_property(
+        select(func.count(group_membership.c.user_id))
+        .where(group_membership.c.group_id == id)
+        .correlate_except(group_membership)
+        .scalar_subquery(),
+        deferred=True
+    )
+
+    def to_dict(self, include_expenses=True):
+        group_dict = {
             "id": self.id,
             "name": self.name,
             "owner_id": self.owner_id,
             "owner": self.owner.to_dict(),
-            "members": [member.to_dict() for member in self.members],
-            "expenses": [expense.to_dict() for expense in self.expenses]
+            "members": [member.to_dict() for member in self.members]
+        }
+
+        # Skipping the expense tree avoids loading it at all
+        if include_expenses:
+            group_dict["expenses"] = [expense.to_dict() for expense in self.expenses]
+
+        return group_dict
+
+class GroupBalance(Base):
+    __tablename__ = "group_balance"
+    group_id: Mapped[int] = mapped_column(ForeignKey("group.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), primary_key=True, index=True)
+    # Net position in the group: sum of amount_paid - amount_owed over the user's splits
+    balance: Mapped[float] = mapped_column(nullable=False, default=0.0)
+
+    user: Mapped["User"] = relationship()
+
+    def to_dict(self):
+        return {
+            "group_id": self.group_id,
+            "user_id": self.user_id,
+            "balance": self.balance,
+            "user": self.user.to_dict() if self.user else None
         }
+
+# Deleted rows, so delta syncs can tell clients what to drop
+class Tombstone(Base):
+    __tablename__ = "tombstone"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    group_id: Mapped[int] = mapped_column(ForeignKey("group.id", ondelete="CASCADE"), nullable=False)
+    # "expense" or "member"
+    entity: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[int] = mapped_column(nullable=False)
+    sync_version: Mapped[int] = mapped_column(nullable=False)
+    deleted_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_tombstone_group_sync_version", "group_id", "sync_version"),
+    )
@@ -0,0 +1,18 @@
+import pytest
+from app import create_app
+from model import Base
+
+@pytest.fixture
+def app():
+    app = create_app({
+        "DATABASE_URL": "sqlite://",
+        "JWT_SECRET_KEY": "splitit-tests-secret-key-0123456789",
+        "PASSWORD_HASH_WORKERS": "0",
+        # Cheap hashes, the tests create many users
+        "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+        "PAYLOAD_LOG_SAMPLE_RATE": "0",
+    })
+    Base.metadata.create_all(app.engine)
+    yield app
+    app.payload_log.stop()
+    app.engine.dispose()
@@ -0,0 +1,73 @@
+import pytest
+
+# Malformed expense payloads are rejected with a JSON 400 naming the problem, before
+# they reach the database or the balance ledger.
+
+@pytest.fixture
+def group(app):
+    client = app.test_client()
+    credentials = {"username": "payer", "password": "secret"}
+    response = client.post('/users/', json={**credentials, "first_name": "Validation", "last_name": "User"})
+    user_id = response.json['user']['id']
+    headers = {"Authorization": f"Bearer {client.post('/users/login', json=credentials).json['access_token']}"}
+    group_id = client.post('/groups/', json={"name": "validation"}, headers=headers).json['group']['id']
+    return {"client": client, "headers": headers, "user_id": user_id, "group_id": group_id}
+
+def expense(user_id, **overrides):
+    return {
+        "title": "Dinner", "description": "", "total_cost": 10.0, "payer_portion": 10.0,
+        "splits": [{"user_id": user_id, "amount_paid": 10.0, "amount_owed": 10.0}],
+        **overrides
+    }
+
+def bulk(group, expenses):
+    return group["client"].post(f'/expenses/bulk?group_id={group["group_id"]}', json={"expenses": expenses}, headers=group["headers"])
+
+@pytest.mark.parametrize("overrides, message", [
+    ({"group_id": "abc"}, "Invalid group ID in expense 1"),
+    ({"group_id": True}, "Invalid group ID in expense 1"),
+    ({"total_cost": "10"}, "Invalid amount in expense 1"),
+    ({"splits": [{"user_id": 0, "amount_paid": "10", "amount_owed": 10.0}]}, "Invalid split amount in expense 1"),
+    ({"splits": [{"user_id": 0, "amount_paid": 10.0, "amount_owed": None}]}, "Invalid split amount in expense 1"),
+    ({"splits": "none"}, "Invalid split data in expense 1"),
+])
+def test_bulk_rejects_malformed_rows(group, overrides, message):
+    if "splits" in overrides and isinstance(overrides["splits"], list):
+        overrides["splits"][0]["user_id"] = group["user_id"]
+
+    response = bulk(group, [expense(group["user_id"]), expense(group["user_id"], **overrides)])
+
+    assert response.status_code == 400
+    assert response.json == {"message": message}
+
+def test_bulk_accepts_valid_rows(group):
+    response = bulk(group, [expense(group["user_id"]), expense(group["user_id"], group_id=group["group_id"], total_cost=10)])
+
+    assert response.status_code == 201
+    assert len(response.json["expense_ids"]) == 2
+
+@pytest.mark.parametrize("split, message", [
+    ({"user_id": [1], "amount_paid": 10.0, "amount_owed": 10.0}, "Invalid split user"),
+    ({"user_id": "1", "amount_paid": 10.0, "amount_owed": 10.0}, "Invalid split user"),
+    ({"user_id": None, "amount_paid": 10.0, "amount_owed": 10.0}, "Invalid split user"),
+    ({"amount_paid": "10", "amount_owed": 10.0}, "Invalid split amount"),
+    ({"amount_paid": 10.0, "amount_owed": False}, "Invalid split amount"),
+    ({"amount_owed": 10.0}, "Invalid split data"),
+])
+def test_create_rejects_malformed_splits(group, split, message):
+    split = {"user_id": group["user_id"], "amount_owed": 10.0, **split}
+    response = group["client"].post(
+        f'/expenses/?group_id={group["group_id"]}', json=expense(group["user_id"], splits=[split]), headers=group["headers"]
+    )
+
+    assert response.status_code == 400
+    assert response.json == {"message": message}
+
+def test_create_rejects_duplicate_split_users(group):
+    split = {"user_id": group["user_id"], "amount_paid": 5.0, "amount_owed": 5.0}
+    response = group["client"].post(
+        f'/expenses/?group_id={group["group_id"]}', json=expense(group["user_id"], splits=[split, split]), headers=group["headers"]
+    )
+
+    assert response.status_code == 400
+    assert response.json == {"message": "Duplicate split user"}
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import event
+
+# The group and expense reads load their object graphs with fixed loader profiles, so
+# the number of SQL statements per request must not grow with expenses or splits.
+
+MEMBERS = 4
+GROUPS = 3
+
+@pytest.fixture
+def dataset(app):
+    client = app.test_client()
+    user_ids, tokens = [], []
+
+    for index in range(MEMBERS):
+        credentials = {"username": f"member{index}", "password": "secret"}
+        response = client.post('/users/', json={**credentials, "first_name": "Query", "last_name": f"Count{index}"})
+        assert response.status_code == 201
+        user_ids.append(response.json['user']['id'])
+        tokens.append(client.post('/users/login', json=credentials).json['access_token'])
+
+    headers = {"Authorization": f"Bearer {tokens[0]}"}
+    group_ids = []
+    for index in range(GROUPS):
+        group_id = client.post('/groups/', json={"name": f"group{index}"}, headers=headers).json['group']['id']
+        for user_id in user_ids[1:]:
+            assert client.post(f'/groups/members?group_id={group_id}', json={"user_id": user_id}, headers=headers).status_code == 200
+        group_ids.append(group_id)
+
+    def add_expenses(count):
+        splits = [
+            {"user_id": user_id, "amount_paid": 12.0 if user_id == user_ids[0] else 0.0, "amount_owed": 12.0 / MEMBERS}
+            for user_id in user_ids
+        ]
+        for group_id in group_ids:
+            for _ in range(count):
+                response = client.post(f'/expenses/?group_id={group_id}', headers=headers, json={
+                    "title": "Dinner", "description": "", "total_cost": 12.0,
+                    "payer_portion": 12.0 / MEMBERS, "splits": splits
+                })
+                assert response.status_code == 201
+
+    return {"client": client, "user_ids": user_ids, "group_ids": group_ids, "add_expenses": add_expenses}
+
+def count_statements(app, client, path):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+
+    event.listen(app.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+        response.get_data()
+    finally:
+        event.remove(app.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements)
+
+# Statements per request: the group version lookup, the snapshot itself and its
+# selectin loads (plus the membership lookup for user_id)
+@pytest.mark.parametrize("path, expected", [
+    ("/groups/?group_id={group_id}", 5),
+    ("/groups/?user_id={user_id}", 6),
+    ("/expenses/?group_id={group_id}", 5),
+])
+def test_statement_count_does_not_grow_with_expenses(app, dataset, path, expected):
+    path = path.format(group_id=dataset["group_ids"][0], user_id=dataset["user_ids"][0])
+    counts = []
+
+    # Each round adds expenses (with a split per member) to every group; the writes
+    # bump the group versions, so every read below misses the snapshot cache
+    for added in (1, 5, 20):
+        dataset["add_expenses"](added)
+        counts.append(count_statements(app, dataset["client"], path))
+
+    assert counts == [expected] * len(counts)
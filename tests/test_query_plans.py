@@ -0,0 +1,38 @@
+import pytest
+from alembic import command
+from alembic.config import Config
+from app import create_app
+from util.query_plans import check_query_plans
+
+# The EXPLAIN check of flask check-query-plans, against the schema the migrations build:
+# a hot query or foreign-key lookup that falls back to a full table scan fails the suite.
+
+@pytest.fixture
+def migrated_app(tmp_path):
+    app = create_app({
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'plans.db'}",
+        "JWT_SECRET_KEY": "splitit-tests-secret-key-0123456789",
+        "PASSWORD_HASH_WORKERS": "0",
+        "PAYLOAD_LOG_SAMPLE_RATE": "0",
+    })
+
+    # No ini file, so env.py leaves the logging setup alone
+    config = Config()
+    config.set_main_option('script_location', 'migrations')
+    with app.engine.begin() as connection:
+        config.attributes['connection'] = connection
+        command.upgrade(config, 'head')
+
+    yield app
+    app.payload_log.stop()
+    app.engine.dispose()
+
+def test_hot_queries_avoid_full_table_scans(migrated_app):
+    results = check_query_plans(migrated_app)
+    failures = [
+        f"{result['query']}: FULL SCAN on {', '.join(result['seq_scans'])}\n  {' '.join(result['statement'].split())}"
+        for result in results if result['seq_scans']
+    ]
+
+    assert results
+    assert not failures, "\n".join(failures)
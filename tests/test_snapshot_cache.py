@@ -0,0 +1,28 @@
+import time
+from util.cache import SnapshotCache
+
+def counters(cache):
+    stats = cache.stats()
+    return {key: stats[key] for key in ("evictions", "expirations", "stale_drops", "invalidations")}
+
+def test_only_capacity_drops_count_as_evictions():
+    cache = SnapshotCache(max_entries=2, ttl=0.05)
+
+    # A write moved the group to version 2
+    cache.set(1, "group", 1, {"id": 1})
+    assert cache.get(1, "group", 2) is None
+
+    cache.set(1, "group", 2, {"id": 1})
+    time.sleep(0.06)
+    assert cache.get(1, "group", 2) is None
+
+    cache.set(2, "group", 1, {"id": 2})
+    cache.invalidate(2)
+
+    assert counters(cache) == {"evictions": 0, "expirations": 1, "stale_drops": 1, "invalidations": 1}
+
+    for group_id in range(3, 6):
+        cache.set(group_id, "group", 1, {"id": group_id})
+
+    assert counters(cache)["evictions"] == 1
+    assert cache.stats()["entries"] == 2
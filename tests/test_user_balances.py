@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import event
+
+# A revalidated GET /users/balances answers from the group versions alone; the
+# balance aggregate only runs when one of the user's groups has changed.
+
+@pytest.fixture
+def member(app):
+    client = app.test_client()
+    credentials = {"username": "balances", "password": "secret"}
+    user_id = client.post('/users/', json={**credentials, "first_name": "Bal", "last_name": "Ance"}).json['user']['id']
+    headers = {"Authorization": f"Bearer {client.post('/users/login', json=credentials).json['access_token']}"}
+    group_ids = [client.post('/groups/', json={"name": f"group{index}"}, headers=headers).json['group']['id'] for index in range(2)]
+    return {"client": client, "headers": headers, "user_id": user_id, "group_ids": group_ids}
+
+def get_balances(app, member, etag=None):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    headers = {**member["headers"], **({"If-None-Match": etag} if etag else {})}
+
+    event.listen(app.engine, 'before_cursor_execute', listener)
+    try:
+        response = member["client"].get('/users/balances', headers=headers)
+    finally:
+        event.remove(app.engine, 'before_cursor_execute', listener)
+    return response, statements
+
+def test_not_modified_skips_the_balance_aggregate(app, member):
+    response, _ = get_balances(app, member)
+    assert response.status_code == 200
+    assert len(response.json["groups"]) == 2
+
+    response, statements = get_balances(app, member, response.headers["ETag"])
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert "group_balance" not in statements[0]
+
+def test_writes_to_any_group_change_the_tag(app, member):
+    response, _ = get_balances(app, member)
+    etag = response.headers["ETag"]
+
+    split = {"user_id": member["user_id"], "amount_paid": 10.0, "amount_owed": 10.0}
+    response = member["client"].post(f'/expenses/?group_id={member["group_ids"][1]}', headers=member["headers"], json={
+        "title": "Dinner", "description": "", "total_cost": 10.0, "payer_portion": 10.0, "splits": [split]
+    })
+    assert response.status_code == 201
+
+    response, statements = get_balances(app, member, etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert any("group_balance" in statement for statement in statements)
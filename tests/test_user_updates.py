@@ -0,0 +1,37 @@
+import pytest
+
+# Group snapshots embed member names, so only name changes may move the group version
+
+@pytest.fixture
+def member(app):
+    client = app.test_client()
+    credentials = {"username": "member", "password": "secret"}
+    user_id = client.post('/users/', json={**credentials, "first_name": "Ada", "last_name": "Lovelace"}).json['user']['id']
+    headers = {"Authorization": f"Bearer {client.post('/users/login', json=credentials).json['access_token']}"}
+    group_id = client.post('/groups/', json={"name": "members"}, headers=headers).json['group']['id']
+    return {"client": client, "headers": headers, "user_id": user_id, "group_id": group_id}
+
+def group_etag(member):
+    response = member["client"].get(f'/groups/?group_id={member["group_id"]}')
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+def update(member, data):
+    response = member["client"].put(f'/users/?user_id={member["user_id"]}', json=data, headers=member["headers"])
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+@pytest.mark.parametrize("data", [{"password": "new-secret"}, {"first_name": "Ada", "last_name": "Lovelace"}])
+def test_updates_outside_snapshots_keep_the_group_version(member, data):
+    etag = group_etag(member)
+    update(member, data)
+    assert group_etag(member) == etag
+
+@pytest.mark.parametrize("data", [{"first_name": "Augusta"}, {"username": "countess"}, {"password": "x", "last_name": "King"}])
+def test_name_changes_bump_the_group_version(member, data):
+    etag = group_etag(member)
+    update(member, data)
+
+    response = member["client"].get(f'/groups/?group_id={member["group_id"]}')
+    assert response.headers["ETag"] != etag
+    changed = [value for key, value in data.items() if key != "password"]
+    assert all(f'"{value}"' in response.get_data(as_text=True) for value in changed)
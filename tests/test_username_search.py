@@ -0,0 +1,41 @@
+import pytest
+from model import User
+
+# The prefix search must match what the baseline ILIKE search matched, including
+# non-ASCII names, on every page of the keyset cursor.
+
+USERNAMES = ["Émile", "émilie", "Éloïse", "Emma", "Zoë", "ZOËY", "zed", "Ana", "ÅSA", "åsa2"]
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    for index, username in enumerate(USERNAMES):
+        response = client.post('/users/', json={
+            "username": username, "password": "secret", "first_name": "Search", "last_name": f"User{index}"
+        })
+        assert response.status_code == 201
+    return client
+
+def search(client, prefix, limit):
+    usernames, cursor = [], None
+    while True:
+        params = {"username": prefix, "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get('/users/', query_string=params)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        usernames += [user["username"] for user in response.json["users"]]
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            return usernames
+
+@pytest.mark.parametrize("prefix", ["É", "é", "ÉM", "e", "Zo", "ZOË", "zoë", "Å", "å", "a"])
+@pytest.mark.parametrize("limit", [1, 2, 100])
+def test_prefix_search_matches_ilike(app, client, prefix, limit):
+    with app.app_context():
+        session = app.Session()
+        expected = {user.username for user in session.query(User).filter(User.username.ilike(f"{prefix}%"))}
+
+    found = search(client, prefix, limit)
+
+    assert expected
+    assert sorted(found) == sorted(expected)
+    assert len(found) == len(set(found))
@@ -0,0 +1,96 @@
+from collections import defaultdict
+from sqlalchemy import select, delete, func, and_
+from model import Expense, ExpenseSplit, Group, GroupBalance, group_membership
+
+# Differences below this are float noise, not drift
+BALANCE_TOLERANCE = 1e-6
+
+def split_deltas(splits, sign=1):
+    deltas = defaultdict(float)
+
+    for split in splits:
+        if split.user_id is not None:
+            deltas[split.user_id] += sign * (split.amount_paid - split.amount_owed)
+
+    return deltas
+
+def apply_balance_deltas(session, group_id, deltas):
+    # Must run inside the caller's transaction so the ledger commits with the expense
+    for user_id, delta in deltas.items():
+        if user_id is None or delta == 0:
+            continue
+
+        updated = session.query(GroupBalance).filter_by(group_id=group_id, user_id=user_id).update(
+            {GroupBalance.balance: GroupBalance.balance + delta},
+            synchronize_session=False
+        )
+
+        if updated == 0:
+            session.add(GroupBalance(group_id=group_id, user_id=user_id, balance=delta))
+
+    session.flush()
+
+def compute_balances(session, group_id=None):
+    query = (
+        select(Expense.group_id, ExpenseSplit.user_id, func.sum(ExpenseSplit.amount_paid - ExpenseSplit.amount_owed))
+        .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)
+        .where(ExpenseSplit.user_id.is_not(None))
+        .group_by(Expense.group_id, ExpenseSplit.user_id)
+    )
+
+    if group_id is not None:
+        query = query.where(Expense.group_id == group_id)
+
+    return {(row[0], row[1]): row[2] or 0.0 for row in session.execute(query)}
+
+# A user's position in every group they belong to, read from the ledger in one query.
+# Groups without a ledger row yet (no splits for the user) are settled.
+def user_balances(session, user_id):
+    rows = session.execute(
+        select(Group.id, Group.name, func.coalesce(GroupBalance.balance, 0.0))
+        .join(group_membership, group_membership.c.group_id == Group.id)
+        .outerjoin(GroupBalance, and_(GroupBalance.group_id == Group.id, GroupBalance.user_id == user_id))
+        .where(group_membership.c.user_id == user_id)
+        .order_by(Group.id)
+    ).all()
+
+    return [
+        {"group_id": group_id, "name": name, "balance": balance}
+        for group_id, name, balance in rows
+    ]
+
+# Recompute the ledger from raw splits, returning the rows that had drifted
+def rebuild_balances(session, group_id=None, check_only=False):
+    expected = compute_balances(session, group_id)
+
+    query = select(GroupBalance.group_id, GroupBalance.user_id, GroupBalance.balance)
+    if group_id is not None:
+        query = query.where(GroupBalance.group_id == group_id)
+    actual = {(row[0], row[1]): row[2] for row in session.execute(query)}
+
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        expected_balance = expected.get(key, 0.0)
+        actual_balance = actual.get(key, 0.0)
+
+        if abs(expected_balance - actual_balance) > BALANCE_TOLERANCE:
+            drift.append({
+                "group_id": key[0],
+                "user_id": key[1],
+                "expected": expected_balance,
+                "actual": actual_balance
+            })
+
+    if not check_only:
+        statement = delete(GroupBalance)
+        if group_id is not None:
+            statement = statement.where(GroupBalance.group_id == group_id)
+        session.execute(statement)
+
+        session.add_all([
+            GroupBalance(group_id=key[0], user_id=key[1], balance=balance)
+            for key, balance in expected.items()
+        ])
+        session.commit()
+
+    return drift
@@ -0,0 +1,189 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Serialized group snapshots (the group payload and expense listings), keyed by
+# (group_id, variant) where the variant is the endpoint plus query string. Entries
+# carry the group version they were built from and are only served while it still
+# matches, so a write another process made can never be served stale.
+
+class LocalBackend:
+    # In-process stand-in for a shared backend
+    def __init__(self):
+        self._groups = {}
+        self._lock = Lock()
+
+    def get(self, group_id, variant):
+        with self._lock:
+            entry = self._groups.get(group_id, {}).get(variant)
+
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, group_id, variant, value, ttl):
+        with self._lock:
+            self._groups.setdefault(group_id, {})[variant] = (time.monotonic() + ttl, value)
+
+    def delete(self, group_id):
+        with self._lock:
+            self._groups.pop(group_id, None)
+
+class RedisBackend:
+    # One hash per group, so invalidating a group is a single DEL
+    def __init__(self, client, dumps, loads, prefix='splitit:snapshot:'):
+        self.client = client
+        self.dumps = dumps
+        self.loads = loads
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, dumps, loads):
+        if redis is None:
+            raise ValueError("SNAPSHOT_CACHE_REDIS_URL is set but redis is not installed")
+        return cls(redis.Redis.from_url(url), dumps, loads)
+
+    def get(self, group_id, variant):
+        value = self.client.hget(f"{self.prefix}{group_id}", variant)
+        return self.loads(value) if value is not None else None
+
+    def set(self, group_id, variant, value, ttl):
+        key = f"{self.prefix}{group_id}"
+        pipe = self.client.pipeline()
+        pipe.hset(key, variant, self.dumps(value))
+        pipe.expire(key, max(int(ttl), 1))
+        pipe.execute()
+
+    def delete(self, group_id):
+        self.client.delete(f"{self.prefix}{group_id}")
+
+class SnapshotCache:
+    def __init__(self, max_entries=1024, ttl=300.0, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+
+        self._entries = OrderedDict()
+        # group_id -> variants cached for it, so invalidation drops every variant
+        self._variants = {}
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        # LRU drops under capacity pressure, apart from entries found expired or outdated
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_drops = 0
+        self.invalidations = 0
+
+    # SNAPSHOT_CACHE_SIZE=0 disables the cache; SNAPSHOT_CACHE_REDIS_URL adds a shared backend
+    @classmethod
+    def from_env(cls, env, dumps, loads):
+        redis_url = env.get('SNAPSHOT_CACHE_REDIS_URL')
+
+        return cls(
+            max_entries=int(env.get('SNAPSHOT_CACHE_SIZE', 1024)),
+            ttl=float(env.get('SNAPSHOT_CACHE_TTL', 300)),
+            backend=RedisBackend.from_url(redis_url, dumps, loads) if redis_url else None
+        )
+
+    def get(self, group_id, variant, version):
+        if self.max_entries <= 0:
+            return None
+
+        key = (group_id, variant)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, entry_version, value = entry
+                if expires >= now and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                if expires < now:
+                    self.expirations += 1
+                else:
+                    self.stale_drops += 1
+                self._drop(key)
+
+        if self.backend is not None:
+            entry = self.backend.get(group_id, variant)
+            if entry is not None and entry[0] == version:
+                self._store(key, version, entry[1])
+                with self._lock:
+                    self.hits += 1
+                return entry[1]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, group_id, variant, version, value):
+        if self.max_entries <= 0:
+            return
+
+        self._store((group_id, variant), version, value)
+
+        if self.backend is not None:
+            self.backend.set(group_id, variant, [version, value], self.ttl)
+
+    def invalidate(self, group_id):
+        with self._lock:
+            for variant in self._variants.pop(group_id, ()):
+                self._entries.pop((group_id, variant), None)
+            self.invalidations += 1
+
+        if self.backend is not None:
+            self.backend.delete(group_id)
+
+    def invalidate_many(self, group_ids):
+        for group_id in group_ids:
+            self.invalidate(group_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "backend": type(self.backend).__name__ if self.backend is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_drops": self.stale_drops,
+                "invalidations": self.invalidations
+            }
+
+    def _store(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            self._variants.setdefault(key[0], set()).add(key[1])
+
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self._forget(oldest)
+                self.evictions += 1
+
+    # Callers hold the lock
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._forget(key)
+
+    def _forget(self, key):
+        variants = self._variants.get(key[0])
+        if variants is not None:
+            variants.discard(key[1])
+            if not variants:
+                del self._variants[key[0]]
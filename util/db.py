@@ -0,0 +1,121 @@
+import time
+from threading import Lock
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class PoolStats:
+    def __init__(self, max_overflow=0):
+        self.max_overflow = max_overflow
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = Lock()
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.total_wait,
+                "wait_seconds_max": self.max_wait,
+                "wait_seconds_avg": self.total_wait / self.checkouts if self.checkouts else 0.0
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    # Times how long each checkout waits for a free connection
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    pass
+
+def _env_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+# Pool sizing comes from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (seconds),
+# DB_POOL_PRE_PING and DB_POOL_RECYCLE (seconds, -1 disables)
+def create_db_engine(database_url, env):
+    if database_url.startswith('sqlite'):
+        # SQLite picks its own pool; sizing options do not apply
+        return create_engine(database_url, echo=False)
+
+    max_overflow = int(env.get('DB_MAX_OVERFLOW', 10))
+    engine = create_engine(database_url, echo=False, poolclass=InstrumentedQueuePool, **_pool_options(env))
+    engine.pool.stats = PoolStats(max_overflow)
+    return engine
+
+def _pool_options(env):
+    return {
+        "pool_size": int(env.get('DB_POOL_SIZE', 5)),
+        "max_overflow": int(env.get('DB_MAX_OVERFLOW', 10)),
+        "pool_timeout": float(env.get('DB_POOL_TIMEOUT', 30)),
+        "pool_pre_ping": _env_bool(env.get('DB_POOL_PRE_PING', 'true')),
+        "pool_recycle": int(env.get('DB_POOL_RECYCLE', 1800))
+    }
+
+# Async drivers for the ASGI mode; the same DATABASE_URL and pool settings apply
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def create_async_db_engine(database_url, env):
+    url = make_url(database_url)
+    if url.get_backend_name() not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{url.get_backend_name()}'")
+    url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+    if url.get_backend_name() == 'sqlite':
+        return create_async_engine(url, echo=False)
+
+    max_overflow = int(env.get('DB_MAX_OVERFLOW', 10))
+    engine = create_async_engine(url, echo=False, poolclass=InstrumentedAsyncQueuePool, **_pool_options(env))
+    engine.pool.stats = PoolStats(max_overflow)
+    return engine
+
+def pool_status(engine):
+    pool = engine.pool
+
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {"pool": type(pool).__name__}
+
+    capacity = pool.size() + pool.stats.max_overflow
+    checked_out = pool.checkedout()
+
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool.stats.max_overflow,
+        "checked_in": pool.checkedin(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "saturation": checked_out / capacity if capacity > 0 else 0.0,
+        **pool.stats.snapshot()
+    }
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import List, Optional
+from sqlalchemy import tuple_
+from sqlalchemy.orm import aliased
+from model import User, Expense, ExpenseSplit
+from util.pagination import DEFAULT_LIMIT, paginate
+
+# Response DTOs built straight from column rows, skipping ORM identity tracking and the
+# per-object to_dict() dict chains. Field order and names match the to_dict() payloads.
+
+@dataclass(slots=True)
+class UserDTO:
+    id: int
+    username: str
+    first_name: str
+    last_name: str
+
+@dataclass(slots=True)
+class SplitDTO:
+    user_id: Optional[int]
+    amount_paid: float
+    amount_owed: float
+    user: Optional[UserDTO]
+
+@dataclass(slots=True)
+class ExpenseDTO:
+    id: int
+    title: str
+    description: str
+    date: str
+    totalCost: float
+    paid_by_id: Optional[int]
+    payer_portion: float
+    group_id: int
+    paid_by: Optional[UserDTO]
+    group: Optional[str]
+    splits: List[SplitDTO]
+
+class _DTOCache:
+    # Users and dates repeat across a page, so each is built or formatted once
+    def __init__(self):
+        self.users = {}
+        self.dates = {}
+
+    def user(self, user_id, username, first_name, last_name):
+        if user_id is None:
+            return None
+
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserDTO(user_id, username, first_name, last_name)
+        return user
+
+    def date(self, value):
+        text = self.dates.get(value)
+        if text is None:
+            text = self.dates[value] = value.isoformat()
+        return text
+
+def expense_page(session, group, cursor=None, limit=DEFAULT_LIMIT):
+    payer = aliased(User)
+    query = (
+        session.query(
+            Expense.id, Expense.title, Expense.description, Expense.date, Expense.totalCost,
+            Expense.paid_by_id, Expense.payer_portion, Expense.group_id,
+            payer.username.label('payer_username'),
+            payer.first_name.label('payer_first_name'),
+            payer.last_name.label('payer_last_name')
+        )
+        .outerjoin(payer, payer.id == Expense.paid_by_id)
+        .filter(Expense.group_id == group.id)
+    )
+    rows, next_cursor = paginate(query, [Expense.date, Expense.id], cursor, limit)
+
+    cache = _DTOCache()
+    expenses = {}
+    # Rows are unpacked by position; named Row attribute access costs far more per column
+    for (expense_id, title, description, date, total_cost, paid_by_id, payer_portion, group_id,
+         payer_username, payer_first_name, payer_last_name) in rows:
+        expenses[expense_id] = ExpenseDTO(
+            expense_id, title, description, cache.date(date), total_cost,
+            paid_by_id, payer_portion, group_id,
+            cache.user(paid_by_id, payer_username, payer_first_name, payer_last_name),
+            group.name, []
+        )
+
+    if rows:
+        # The page is a contiguous (date, id) range, which avoids an IN list of expense ids
+        key = tuple_(Expense.date, Expense.id)
+        split_rows = (
+            session.query(
+                ExpenseSplit.expense_id, ExpenseSplit.user_id, ExpenseSplit.amount_paid, ExpenseSplit.amount_owed,
+                User.username, User.first_name, User.last_name
+            )
+            .join(Expense, Expense.id == ExpenseSplit.expense_id)
+            .outerjoin(User, User.id == ExpenseSplit.user_id)
+            .filter(
+                Expense.group_id == group.id,
+                key >= tuple_(rows[0].date, rows[0].id),
+                key <= tuple_(rows[-1].date, rows[-1].id)
+            )
+        )
+
+        for expense_id, user_id, amount_paid, amount_owed, username, first_name, last_name in split_rows:
+            # Expenses committed into the range after the page was read are not on it
+            expense = expenses.get(expense_id)
+            if expense is None:
+                continue
+
+            expense.splits.append(SplitDTO(
+                user_id, amount_paid, amount_owed, cache.user(user_id, username, first_name, last_name)
+            ))
+
+    return list(expenses.values()), next_cursor
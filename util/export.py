@@ -0,0 +1,90 @@
+import csv
+import io
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from model import User, Expense, ExpenseSplit
+
+# Rows fetched per round trip. yield_per also turns on server-side cursors
+# (stream_results), so only one batch is ever held in memory.
+EXPORT_BATCH_SIZE = 1000
+
+CSV_COLUMNS = (
+    'expense_id', 'date', 'title', 'description', 'total_cost', 'paid_by_id', 'paid_by_username',
+    'payer_portion', 'split_user_id', 'split_username', 'amount_paid', 'amount_owed'
+)
+
+def export_rows(session, group_id, batch_size=EXPORT_BATCH_SIZE):
+    payer = aliased(User)
+    split_user = aliased(User)
+    stmt = (
+        select(
+            Expense.id, Expense.date, Expense.title, Expense.description, Expense.totalCost,
+            Expense.paid_by_id, payer.username, Expense.payer_portion,
+            ExpenseSplit.user_id, split_user.username, ExpenseSplit.amount_paid, ExpenseSplit.amount_owed
+        )
+        .outerjoin(payer, payer.id == Expense.paid_by_id)
+        .outerjoin(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)
+        .outerjoin(split_user, split_user.id == ExpenseSplit.user_id)
+        .where(Expense.group_id == group_id)
+        .order_by(Expense.date, Expense.id, ExpenseSplit.user_id)
+    )
+    result = session.execute(stmt, execution_options={"yield_per": batch_size})
+
+    for partition in result.partitions():
+        yield partition
+
+# One line per split; expenses without splits get a single line with empty split columns
+def stream_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow((row[0], row[1].isoformat(), *row[2:]))
+        yield buffer.getvalue()
+
+# One JSON document per expense with its splits nested, in the to_dict() field names
+def stream_ndjson(batches, dumps):
+    expense = None
+
+    for rows in batches:
+        lines = []
+        for row in rows:
+            if expense is None or expense["id"] != row[0]:
+                if expense is not None:
+                    lines.append(dumps(expense))
+                expense = {
+                    "id": row[0],
+                    "date": row[1].isoformat(),
+                    "title": row[2],
+                    "description": row[3],
+                    "totalCost": row[4],
+                    "paid_by_id": row[5],
+                    "paid_by_username": row[6],
+                    "payer_portion": row[7],
+                    "splits": []
+                }
+
+            if row[8] is not None or row[10] is not None:
+                expense["splits"].append({
+                    "user_id": row[8],
+                    "username": row[9],
+                    "amount_paid": row[10],
+                    "amount_owed": row[11]
+                })
+
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    if expense is not None:
+        yield dumps(expense) + "\n"
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
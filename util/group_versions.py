@@ -0,0 +1,57 @@
+import hashlib
+from flask import current_app, request
+from sqlalchemy import select, update
+from model import Group, group_membership
+
+# Every write that changes what a group's snapshot looks like bumps Group.version in
+# the same transaction. GET handlers derive strong ETags from the versions, so an
+# unchanged group costs one indexed lookup instead of a full serialization. The new
+# versions are returned so writes can stamp the rows they touch for delta sync.
+
+def bump_group_versions(session, group_ids):
+    group_ids = list(group_ids)
+
+    if not group_ids:
+        return {}
+
+    rows = session.execute(
+        update(Group).where(Group.id.in_(group_ids)).values(version=Group.version + 1)
+        .returning(Group.id, Group.version),
+        execution_options={"synchronize_session": False}
+    )
+    return dict(rows.all())
+
+def bump_group_version(session, group_id):
+    return bump_group_versions(session, [group_id]).get(group_id)
+
+def user_group_ids(session, user_id):
+    return session.scalars(select(group_membership.c.group_id).where(group_membership.c.user_id == user_id)).all()
+
+# (group_id, version) of every group the user belongs to: one index range, so views
+# spanning the user's groups can answer If-None-Match before their aggregates run
+def user_group_versions(session, user_id):
+    rows = session.execute(
+        select(Group.id, Group.version)
+        .join(group_membership, group_membership.c.group_id == Group.id)
+        .where(group_membership.c.user_id == user_id)
+        .order_by(Group.id)
+    )
+    return [(group_id, version) for group_id, version in rows]
+
+def make_etag(*parts):
+    return etag_for(request.path, request.query_string, *parts)
+
+# Shared with the ASGI handlers so both serving modes produce the same tags
+def etag_for(path, query_string, *parts):
+    # The query string is part of the tag: fields, cursor and limit all change the body
+    key = repr((path, query_string, parts)).encode()
+    return hashlib.sha1(key).hexdigest()
+
+# Returns a 304 response when the client already has this version, otherwise None
+def not_modified(etag):
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    return None
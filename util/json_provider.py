@@ -0,0 +1,38 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    # orjson encodes dicts, dataclass DTOs and dates natively, straight to bytes
+    option = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+JSON_BACKENDS = {
+    'stdlib': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+# JSON_BACKEND picks the encoder; by default orjson is used whenever it is installed
+def create_json_provider(app, backend=None):
+    if backend is None:
+        backend = 'orjson' if orjson is not None else 'stdlib'
+
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON_BACKEND '{backend}', expected one of {sorted(JSON_BACKENDS)}")
+    if backend == 'orjson' and orjson is None:
+        raise ValueError("JSON_BACKEND is 'orjson' but orjson is not installed")
+
+    return JSON_BACKENDS[backend](app)
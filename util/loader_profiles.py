@@ -0,0 +1,27 @@
+from sqlalchemy.orm import joinedload, selectinload
+from model import Group, Expense, ExpenseSplit
+
+# Named loader strategies for the serialization paths in model.py. Each profile
+# loads everything the matching to_dict() walks, so the number of queries stays
+# fixed no matter how many members, expenses or splits a group has.
+
+# Expense.to_dict(): paid_by, group name and every split's user
+EXPENSE_DETAIL = (
+    joinedload(Expense.paid_by),
+    joinedload(Expense.group),
+    selectinload(Expense.splits).joinedload(ExpenseSplit.user),
+)
+
+# Group.to_dict() without the expense tree
+GROUP_HEADER = (
+    joinedload(Group.owner),
+    selectinload(Group.members),
+)
+
+# Group.to_dict(): owner, members and the full expense tree
+GROUP_SNAPSHOT = GROUP_HEADER + (
+    selectinload(Group.expenses).options(
+        joinedload(Expense.paid_by),
+        selectinload(Expense.splits).joinedload(ExpenseSplit.user),
+    ),
+)
@@ -0,0 +1,231 @@
+import time
+from contextvars import ContextVar
+from threading import Lock
+from sqlalchemy import event
+
+# Per-route request metrics in the Prometheus text format, served at GET /metrics.
+# Every request records its latency, the SQL statements it ran, time spent in the
+# database, rows the driver reported and response bytes. Counters live in this process;
+# with several server workers, scrape each one (or aggregate them in Prometheus).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Slow-request log entries show at most this much of each statement
+MAX_STATEMENT_CHARS = 500
+
+# Statistics of the request being handled on this thread (or streamed from it)
+_current = ContextVar('request_stats', default=None)
+
+class RequestStats:
+    def __init__(self, capture_statements=False):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        # (seconds, statement) pairs, only kept while the slow-request log is on
+        self.captured = [] if capture_statements else None
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": str(bound)}, cumulative
+
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_sample(name, labels, value):
+    label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+class RequestMetrics:
+    def __init__(self, logger, slow_request_seconds=None, slow_request_statements=20):
+        self.logger = logger
+        self.slow_request_seconds = slow_request_seconds
+        self.slow_request_statements = slow_request_statements
+
+        self._requests = {}
+        self._latency = {}
+        self._statements = {}
+        self._totals = {}
+        self._lock = Lock()
+
+    # SLOW_REQUEST_SECONDS turns on the slow-request log; it is off when unset or 0
+    @classmethod
+    def from_env(cls, env, logger):
+        slow_request_seconds = float(env.get('SLOW_REQUEST_SECONDS') or 0)
+
+        return cls(
+            logger,
+            slow_request_seconds=slow_request_seconds or None,
+            slow_request_statements=int(env.get('SLOW_REQUEST_MAX_STATEMENTS', 20))
+        )
+
+    def instrument(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is None or not conn.info.get('metrics_query_start'):
+            return
+
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+        # psycopg2 reports rows returned by SELECTs; sqlite3 only reports rows written
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+        if stats.captured is not None:
+            stats.captured.append((elapsed, statement))
+
+    def start_request(self):
+        stats = RequestStats(capture_statements=self.slow_request_seconds is not None)
+        _current.set(stats)
+        return stats
+
+    # Drops the statistics of a request that ends up being handled elsewhere
+    def abandon_request(self):
+        _current.set(None)
+
+    def finish_request(self, request, response):
+        stats = _current.get()
+        if stats is None:
+            return response
+
+        labels = (request.method, request.url_rule.rule if request.url_rule else "unmatched")
+        path = request.full_path
+
+        # Streamed bodies (exports, event streams) are measured until the last chunk is sent
+        if response.is_streamed:
+            response.response = self._count_bytes(response.response, stats)
+        else:
+            stats.bytes = response.calculate_content_length() or 0
+
+        response.call_on_close(lambda: self.complete_request(labels, path, response.status_code, stats))
+        return response
+
+    # labels are (method, route rule); also called by the ASGI mode for its native routes
+    def complete_request(self, labels, path, status_code, stats):
+        _current.set(None)
+        self.record(labels, status_code, stats)
+        self._log_if_slow(labels[0], path, status_code, stats)
+
+    @staticmethod
+    def _count_bytes(iterable, stats):
+        try:
+            for chunk in iterable:
+                stats.bytes += len(chunk.encode() if isinstance(chunk, str) else chunk)
+                yield chunk
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+
+    def record(self, labels, status_code, stats):
+        elapsed = time.perf_counter() - stats.start
+
+        with self._lock:
+            key = (*labels, str(status_code))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            if labels not in self._latency:
+                self._latency[labels] = Histogram(LATENCY_BUCKETS)
+                self._statements[labels] = Histogram(STATEMENT_BUCKETS)
+                self._totals[labels] = {"db_seconds": 0.0, "rows": 0, "bytes": 0}
+
+            self._latency[labels].observe(elapsed)
+            self._statements[labels].observe(stats.statements)
+            totals = self._totals[labels]
+            totals["db_seconds"] += stats.db_seconds
+            totals["rows"] += stats.rows
+            totals["bytes"] += stats.bytes
+
+    def _log_if_slow(self, method, path, status_code, stats):
+        elapsed = time.perf_counter() - stats.start
+        if self.slow_request_seconds is None or elapsed < self.slow_request_seconds:
+            return
+
+        slowest = sorted(stats.captured, key=lambda captured: captured[0], reverse=True)[:self.slow_request_statements]
+        lines = [
+            f"Slow request: {method} {path} took {elapsed * 1000:.1f} ms (status {status_code}, "
+            f"{stats.statements} statements, {stats.db_seconds * 1000:.1f} ms in database, "
+            f"{stats.rows} rows, {stats.bytes} bytes)"
+        ]
+        lines.extend(
+            f"  {seconds * 1000:.1f} ms: {' '.join(statement.split())[:MAX_STATEMENT_CHARS]}"
+            for seconds, statement in slowest
+        )
+        self.logger.warning("\n".join(lines))
+
+    def render(self, gauges=None):
+        with self._lock:
+            requests = dict(self._requests)
+            latency = {labels: list(histogram.samples(
+                "splitit_http_request_duration_seconds", {"method": labels[0], "route": labels[1]}
+            )) for labels, histogram in self._latency.items()}
+            statements = {labels: list(histogram.samples(
+                "splitit_http_request_sql_statements", {"method": labels[0], "route": labels[1]}
+            )) for labels, histogram in self._statements.items()}
+            totals = {labels: dict(values) for labels, values in self._totals.items()}
+
+        lines = []
+
+        def family(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(_format_sample(*sample) for sample in samples)
+
+        family("splitit_http_requests_total", "counter", "Requests handled, by route and status.", (
+            ("splitit_http_requests_total", {"method": method, "route": route, "status": status}, count)
+            for (method, route, status), count in sorted(requests.items())
+        ))
+        family("splitit_http_request_duration_seconds", "histogram", "Request latency, including streaming the body.", (
+            sample for labels in sorted(latency) for sample in latency[labels]
+        ))
+        family("splitit_http_request_sql_statements", "histogram", "SQL statements executed per request.", (
+            sample for labels in sorted(statements) for sample in statements[labels]
+        ))
+
+        for key, name, help_text in (
+            ("db_seconds", "splitit_http_request_db_seconds_total", "Time spent executing SQL."),
+            ("rows", "splitit_http_request_db_rows_total", "Rows returned or written, as reported by the driver."),
+            ("bytes", "splitit_http_response_bytes_total", "Response body bytes sent."),
+        ):
+            family(name, "counter", help_text, (
+                (name, {"method": labels[0], "route": labels[1]}, totals[labels][key]) for labels in sorted(totals)
+            ))
+
+        for name, (help_text, value) in (gauges or {}).items():
+            family(name, "gauge", help_text, ((name, {}, value),))
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+import base64
+import datetime
+import json
+from sqlalchemy import Date, Integer, String, tuple_
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+class InvalidCursor(ValueError):
+    pass
+
+def get_limit(args):
+    limit = args.get('limit', default=DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime.date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor(cursor)
+
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+# Cursors come from clients, so every value must match its column's type before it reaches SQL
+def _cursor_value(column, value):
+    if isinstance(column.type, Date):
+        return datetime.date.fromisoformat(value)
+
+    if isinstance(column.type, Integer):
+        expected = int
+    elif isinstance(column.type, String):
+        expected = str
+    else:
+        # Untyped expressions, e.g. lower(username): any JSON scalar
+        expected = (str, int, float)
+
+    if isinstance(value, bool) or not isinstance(value, expected):
+        raise TypeError(f"Cursor value {value!r} does not match column {column}")
+    return value
+
+# Keyset pagination: seek past the cursor in SQL instead of offsetting or slicing in Python.
+# columns must form a unique ordering (end with the primary key). cursor_values extracts the
+# ordering values from an item when the columns are expressions rather than mapped attributes.
+def paginate(query, columns, cursor=None, limit=DEFAULT_LIMIT, cursor_values=None):
+    if cursor:
+        values = decode_cursor(cursor, columns)
+
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+
+    items = query.order_by(*columns).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        if cursor_values is None:
+            values = [getattr(items[-1], column.key) for column in columns]
+        else:
+            values = cursor_values(items[-1])
+        next_cursor = encode_cursor(values)
+
+    return items, next_cursor
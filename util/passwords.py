@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import BoundedSemaphore, Lock
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class HasherOverloaded(Exception):
+    pass
+
+class PasswordHasher:
+    # Hashing is CPU bound, so it runs in a bounded process pool instead of on the
+    # request thread. When max_pending hashes are already queued, new ones fail fast.
+    def __init__(self, method='scrypt', salt_length=16, workers=None, max_pending=None, timeout=30.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending if max_pending is not None else max(self.workers, 1) * 4
+        self.timeout = timeout
+
+        self._slots = BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_lock = Lock()
+        self._method_prefix = None
+
+    # PASSWORD_HASH_METHOD takes a werkzeug method, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+    # PASSWORD_HASH_WORKERS=0 hashes inline on the request thread.
+    @classmethod
+    def from_env(cls, env):
+        workers = env.get('PASSWORD_HASH_WORKERS')
+        max_pending = env.get('PASSWORD_HASH_QUEUE_LIMIT')
+
+        return cls(
+            method=env.get('PASSWORD_HASH_METHOD', 'scrypt'),
+            salt_length=int(env.get('PASSWORD_HASH_SALT_LENGTH', 16)),
+            workers=int(workers) if workers is not None else None,
+            max_pending=int(max_pending) if max_pending is not None else None,
+            timeout=float(env.get('PASSWORD_HASH_TIMEOUT', 30))
+        )
+
+    def _get_executor(self):
+        # Created on first use so every forked server worker gets its own pool. Hash
+        # processes start from a clean forkserver (spawn where that is unavailable),
+        # never as forks of a server process that already runs threads.
+        with self._executor_lock:
+            if self._executor is None:
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(start_method)
+                )
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers == 0:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            raise HasherOverloaded(f"{self.max_pending} password hashes already pending")
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        # The slot is held until the hash actually finishes, even after the caller gave up on it
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as e:
+            raise HasherOverloaded(f"Password hash took longer than {self.timeout}s") from e
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    # True when a stored hash was made with different parameters than the configured ones
+    def needs_rehash(self, password_hash):
+        if self._method_prefix is None:
+            # werkzeug expands defaults (e.g. "scrypt" -> "scrypt:32768:8:1"), so compare against a real hash
+            self._method_prefix = self.hash('').split('$', 1)[0]
+
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
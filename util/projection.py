@@ -0,0 +1,186 @@
+import datetime
+from collections import defaultdict
+from sqlalchemy.orm import load_only, raiseload, selectinload, undefer
+from model import User, Group, Expense, ExpenseSplit
+
+# Sparse fieldsets: a fields=/depth= projection decides both what gets loaded and what
+# gets serialized, so relationships nobody asked for are never queried.
+#
+#   fields=id,name,member_count,owner.username   dotted paths reach into relationships
+#   fields=id,owner                               a bare relationship serializes its columns
+#   depth=N                                       relationship levels kept below the resource
+
+class InvalidProjection(ValueError):
+    pass
+
+class Relation:
+    def __init__(self, attribute, target, many=False, local_columns=()):
+        self.attribute = attribute
+        self.target = target
+        self.many = many
+        # Columns on the parent that loading the relationship depends on
+        self.local_columns = local_columns
+
+class Computed:
+    def __init__(self, loader, getter, local_columns=()):
+        self.loader = loader
+        self.getter = getter
+        self.local_columns = local_columns
+
+class ModelFields:
+    def __init__(self, key_columns, scalars, relations=None, computed=None):
+        self.key_columns = key_columns
+        self.scalars = {column.key: column for column in scalars}
+        self.relations = relations or {}
+        self.computed = computed or {}
+
+USER_FIELDS = ModelFields(
+    key_columns=(User.id,),
+    scalars=(User.id, User.username, User.first_name, User.last_name)
+)
+
+SPLIT_FIELDS = ModelFields(
+    key_columns=(ExpenseSplit.user_id, ExpenseSplit.expense_id),
+    scalars=(ExpenseSplit.user_id, ExpenseSplit.amount_paid, ExpenseSplit.amount_owed),
+    relations={
+        "user": Relation(ExpenseSplit.user, USER_FIELDS, local_columns=(ExpenseSplit.user_id,))
+    }
+)
+
+EXPENSE_FIELDS = ModelFields(
+    key_columns=(Expense.id,),
+    scalars=(
+        Expense.id, Expense.title, Expense.description, Expense.date,
+        Expense.totalCost, Expense.paid_by_id, Expense.payer_portion, Expense.group_id
+    ),
+    relations={
+        "paid_by": Relation(Expense.paid_by, USER_FIELDS, local_columns=(Expense.paid_by_id,)),
+        "splits": Relation(Expense.splits, SPLIT_FIELDS, many=True)
+    },
+    computed={
+        "group": Computed(
+            selectinload(Expense.group).load_only(Group.name),
+            lambda expense: expense.group.name if expense.group else None,
+            local_columns=(Expense.group_id,)
+        )
+    }
+)
+
+GROUP_FIELDS = ModelFields(
+    key_columns=(Group.id,),
+    scalars=(Group.id, Group.name, Group.owner_id),
+    relations={
+        "owner": Relation(Group.owner, USER_FIELDS, local_columns=(Group.owner_id,)),
+        "members": Relation(Group.members, USER_FIELDS, many=True),
+        "expenses": Relation(Group.expenses, EXPENSE_FIELDS, many=True)
+    },
+    computed={
+        "member_count": Computed(undefer(Group.member_count), lambda group: group.member_count)
+    }
+)
+
+def _expand(spec, depth):
+    tree = {name: None for name in spec.scalars}
+
+    if depth > 0:
+        for name, relation in spec.relations.items():
+            tree[name] = _expand(relation.target, depth - 1)
+
+    return tree
+
+def _merge(tree, other):
+    for name, subtree in other.items():
+        if isinstance(tree.get(name), dict) and isinstance(subtree, dict):
+            _merge(tree[name], subtree)
+        else:
+            tree[name] = subtree
+    return tree
+
+def _parse(spec, paths, depth, level, prefix=''):
+    tree = {}
+    nested = defaultdict(list)
+
+    for path in paths:
+        name, _, rest = path.partition('.')
+
+        if name in spec.relations:
+            nested[name].append(rest)
+        elif (name in spec.scalars or name in spec.computed) and not rest:
+            tree[name] = None
+        else:
+            raise InvalidProjection(prefix + path)
+
+    for name, rests in nested.items():
+        target = spec.relations[name].target
+        subtree = _expand(target, max(depth - level, 0)) if '' in rests else {}
+        tree[name] = _merge(subtree, _parse(target, [rest for rest in rests if rest], depth, level + 1, f"{prefix}{name}."))
+
+    return tree
+
+def _options(spec, tree, required=()):
+    columns = [*spec.key_columns, *required]
+    options = []
+
+    for name, subtree in tree.items():
+        if name in spec.relations:
+            relation = spec.relations[name]
+            columns.extend(relation.local_columns)
+            options.append(selectinload(relation.attribute).options(*_options(relation.target, subtree)))
+        elif name in spec.computed:
+            computed = spec.computed[name]
+            columns.extend(computed.local_columns)
+            options.append(computed.loader)
+        else:
+            columns.append(spec.scalars[name])
+
+    # Anything outside the projection must never be lazy loaded behind our back
+    return [load_only(*dict.fromkeys(columns)), *options, raiseload('*')]
+
+def _serialize(spec, tree, obj):
+    data = {}
+
+    for name, subtree in tree.items():
+        if name in spec.relations:
+            relation = spec.relations[name]
+            value = getattr(obj, relation.attribute.key)
+
+            if relation.many:
+                data[name] = [_serialize(relation.target, subtree, item) for item in value]
+            else:
+                data[name] = _serialize(relation.target, subtree, value) if value is not None else None
+        elif name in spec.computed:
+            data[name] = spec.computed[name].getter(obj)
+        else:
+            value = getattr(obj, name)
+            data[name] = value.isoformat() if isinstance(value, datetime.date) else value
+
+    return data
+
+class Projection:
+    def __init__(self, spec, tree):
+        self.spec = spec
+        self.tree = tree
+
+    # Returns None when neither fields nor depth is given, meaning the full to_dict() shape
+    @classmethod
+    def from_args(cls, spec, args):
+        fields = args.get('fields', type=str)
+        depth = args.get('depth', type=int)
+
+        if fields is None and depth is None:
+            return None
+        if depth is not None and depth < 0:
+            raise InvalidProjection(f"depth={depth}")
+
+        if fields is None:
+            return cls(spec, _expand(spec, depth))
+
+        paths = [path.strip() for path in fields.split(',') if path.strip()]
+        return cls(spec, _parse(spec, paths, 1 if depth is None else depth, 1))
+
+    # required: columns the caller reads itself, e.g. the pagination keys
+    def load_options(self, *required):
+        return _options(self.spec, self.tree, required)
+
+    def serialize(self, obj):
+        return _serialize(self.spec, self.tree, obj)
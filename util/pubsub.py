@@ -0,0 +1,177 @@
+import queue
+from collections import defaultdict
+from threading import Lock, Thread
+from util.sync import encode_sync_token
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Fan-out of group change events to SSE subscribers. Each subscriber gets a small
+# bounded queue; a subscriber that falls behind loses events and is told to resync
+# (through GET /groups/changes) instead of growing memory without bound.
+
+def group_channel(group_id):
+    return f"group:{group_id}"
+
+def group_event(event_type, group_id, version=None, **fields):
+    event = {"type": event_type, "group_id": group_id, **fields}
+
+    if version is not None:
+        event["sync_token"] = encode_sync_token(version)
+    return event
+
+class Subscription:
+    # notify() is called on the publishing thread after every delivery attempt; the
+    # ASGI mode uses it to wake a waiting coroutine instead of blocking in get()
+    def __init__(self, broker, channel, max_pending, notify=None):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(max_pending)
+        self._notify = notify
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+            delivered = True
+        except queue.Full:
+            self.overflowed = True
+            delivered = False
+
+        if self._notify is not None:
+            self._notify()
+        return delivered
+
+    # Returns None when nothing arrives within the timeout
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class LocalBroker:
+    # Delivers within this process only; also the stand-in for a shared broker
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._channels = defaultdict(set)
+        self._lock = Lock()
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, channel, notify=None):
+        subscription = Subscription(self, channel, self.max_pending, notify)
+
+        with self._lock:
+            self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            self.published += 1
+        self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+
+        delivered = sum(subscription.put(message) for subscription in subscriptions)
+
+        with self._lock:
+            self.delivered += delivered
+            self.dropped += len(subscriptions) - delivered
+
+    def stats(self):
+        with self._lock:
+            subscribers = sum(len(subscriptions) for subscriptions in self._channels.values())
+            channels = len(self._channels)
+
+        return {
+            "broker": type(self).__name__,
+            "channels": channels,
+            "subscribers": subscribers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped
+        }
+
+    def close(self):
+        pass
+
+class RedisBroker(LocalBroker):
+    # Publishes through Redis so every worker sees every write. Each worker holds one
+    # pattern subscription and fans messages out to its local subscribers.
+    def __init__(self, client, dumps, loads, prefix='splitit:events:', max_pending=100):
+        super().__init__(max_pending)
+        self.client = client
+        self.dumps = dumps
+        self.loads = loads
+        self.prefix = prefix
+
+        self._pubsub = None
+        self._listener = None
+        self._listener_lock = Lock()
+
+    @classmethod
+    def from_url(cls, url, dumps, loads, max_pending=100):
+        if redis is None:
+            raise ValueError("EVENTS_REDIS_URL is set but redis is not installed")
+        return cls(redis.Redis.from_url(url), dumps, loads, max_pending=max_pending)
+
+    def subscribe(self, channel, notify=None):
+        self._start_listener()
+        return super().subscribe(channel, notify)
+
+    def publish(self, channel, message):
+        with self._lock:
+            self.published += 1
+        self.client.publish(f"{self.prefix}{channel}", self.dumps(message))
+
+    def _start_listener(self):
+        # Started on first subscribe so every forked server worker gets its own
+        with self._listener_lock:
+            if self._listener is not None:
+                return
+
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.psubscribe(f"{self.prefix}*")
+            self._listener = Thread(target=self._listen, name='splitit-events', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        for message in self._pubsub.listen():
+            if message.get('type') != 'pmessage':
+                continue
+
+            channel = message['channel']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            self._deliver(channel[len(self.prefix):], self.loads(message['data']))
+
+    def close(self):
+        with self._listener_lock:
+            if self._pubsub is not None:
+                self._pubsub.close()
+
+# EVENTS_REDIS_URL shares events across workers; otherwise they stay in-process
+def create_broker(env, dumps, loads):
+    max_pending = int(env.get('EVENTS_MAX_PENDING', 100))
+    redis_url = env.get('EVENTS_REDIS_URL')
+
+    if redis_url:
+        return RedisBroker.from_url(redis_url, dumps, loads, max_pending=max_pending)
+    return LocalBroker(max_pending=max_pending)
@@ -0,0 +1,188 @@
+import datetime
+import json
+import random
+import re
+from flask.globals import app_ctx
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+from model import User, Group, Expense, ExpenseSplit, GroupBalance, Tombstone, group_membership
+from util.sync import encode_sync_token
+
+# Query plan regression check (flask check-query-plans). Seeds a dataset inside a
+# transaction that is always rolled back, replays the hot read endpoints of the three
+# blueprints through the test client while capturing every SELECT they issue, and
+# EXPLAINs each one. A full table scan on any of them is reported as a failure.
+
+HOT_ENDPOINTS = (
+    '/users/?user_id={user_id}',
+    '/users/?username={username_prefix}',
+    '/users/balances',
+    '/groups/?group_id={group_id}',
+    '/groups/?user_id={user_id}',
+    '/groups/?user_id={user_id}&fields=id,name,member_count',
+    '/groups/balances?group_id={group_id}',
+    '/groups/settle?group_id={group_id}',
+    '/groups/summary?group_id={group_id}&by=month',
+    '/groups/summary?group_id={group_id}&by=payer&from=2024-06-01',
+    '/groups/changes?group_id={group_id}&since={sync_token}',
+    '/expenses/?group_id={group_id}',
+    '/expenses/?group_id={group_id}&fields=id,title,splits',
+    '/expenses/export?group_id={group_id}&format=ndjson',
+)
+
+# Foreign-key lookups the database runs for ON DELETE CASCADE / SET NULL when a user
+# or expense is deleted, plus the user-wide updates in util/sync.py
+def cascade_queries(ids):
+    return (
+        ('group.owner_id', select(Group.id).where(Group.owner_id == ids['user_id'])),
+        ('group_membership.user_id', select(group_membership.c.group_id).where(group_membership.c.user_id == ids['user_id'])),
+        ('expense.paid_by_id', select(Expense.id).where(Expense.paid_by_id == ids['user_id'])),
+        ('expense_split.user_id', select(ExpenseSplit.expense_id).where(ExpenseSplit.user_id == ids['user_id'])),
+        ('expense_split.expense_id', select(ExpenseSplit.user_id).where(ExpenseSplit.expense_id == ids['expense_id'])),
+        ('group_balance.user_id', select(GroupBalance.group_id).where(GroupBalance.user_id == ids['user_id'])),
+    )
+
+def seed_dataset(connection, users=500, groups=100, members_per_group=8, expenses_per_group=100, rng=None):
+    rng = rng or random.Random(0)
+
+    user_ids = connection.execute(
+        insert(User).returning(User.id, sort_by_parameter_order=True),
+        [
+            {"username": f"plancheck-{i:05d}", "password": "x", "first_name": "Plan", "last_name": "Check"}
+            for i in range(users)
+        ]
+    ).scalars().all()
+
+    group_ids = connection.execute(
+        insert(Group).returning(Group.id, sort_by_parameter_order=True),
+        [{"name": f"plancheck-{i}", "owner_id": rng.choice(user_ids), "version": 2} for i in range(groups)]
+    ).scalars().all()
+
+    members = {group_id: rng.sample(user_ids, members_per_group) for group_id in group_ids}
+    connection.execute(insert(group_membership), [
+        {"group_id": group_id, "user_id": user_id, "sync_version": rng.randint(0, 2)}
+        for group_id, user_ids_in_group in members.items() for user_id in user_ids_in_group
+    ])
+
+    start = datetime.date(2024, 1, 1)
+    expense_rows = [
+        {
+            "title": "plancheck", "description": "", "date": start + datetime.timedelta(days=rng.randrange(730)),
+            "totalCost": 10.0, "paid_by_id": rng.choice(members[group_id]), "payer_portion": 1.0,
+            "group_id": group_id, "sync_version": rng.randint(0, 2)
+        }
+        for group_id in group_ids for _ in range(expenses_per_group)
+    ]
+    expense_ids = connection.execute(
+        insert(Expense).returning(Expense.id, sort_by_parameter_order=True), expense_rows
+    ).scalars().all()
+
+    connection.execute(insert(ExpenseSplit), [
+        {"user_id": user_id, "expense_id": expense_id, "amount_paid": 0.0, "amount_owed": 1.0}
+        for row, expense_id in zip(expense_rows, expense_ids) for user_id in members[row['group_id']]
+    ])
+    connection.execute(insert(GroupBalance), [
+        {"group_id": group_id, "user_id": user_id, "balance": 0.0}
+        for group_id, user_ids_in_group in members.items() for user_id in user_ids_in_group
+    ])
+    connection.execute(insert(Tombstone), [
+        {"group_id": group_id, "entity": "expense", "entity_id": 0, "sync_version": rng.randint(1, 2)}
+        for group_id in group_ids for _ in range(5)
+    ])
+
+    group_id = group_ids[len(group_ids) // 2]
+    return {
+        "group_id": group_id,
+        "user_id": members[group_id][0],
+        "expense_id": expense_ids[len(expense_ids) // 2],
+        "username_prefix": "plancheck-001",
+        "sync_token": encode_sync_token(1)
+    }
+
+def explain(connection, statement, parameters):
+    dialect = connection.dialect.name
+
+    if dialect == 'postgresql':
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan, _postgresql_scans(plan[0]['Plan'])
+
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        plan = [row[3] for row in rows]
+        # "SCAN t" is a full table scan; "SEARCH t USING INDEX" and "SCAN t USING INDEX" are not
+        return plan, [match.group(1) for match in map(re.compile(r'^SCAN (\w+)$').match, plan) if match]
+
+    raise ValueError(f"Query plan checks are not supported on '{dialect}'")
+
+def _postgresql_scans(node):
+    scans = [node.get('Alias') or node.get('Relation Name')] if node.get('Node Type') == 'Seq Scan' else []
+
+    for child in node.get('Plans', ()):
+        scans.extend(_postgresql_scans(child))
+    return scans
+
+def check_query_plans(app, **seed_options):
+    results = []
+
+    with app.engine.connect() as connection:
+        transaction = connection.begin()
+
+        try:
+            ids = seed_dataset(connection, **seed_options)
+            connection.execute(text("ANALYZE"))
+
+            if connection.dialect.name == 'postgresql':
+                # With sequential scans priced out, one still appears only where no index applies
+                connection.execute(text("SET LOCAL enable_seqscan = off"))
+
+            captured = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                if statement.lstrip().upper().startswith('SELECT'):
+                    captured.append((statement, parameters))
+
+            # Handlers run on this connection; their commits only release savepoints
+            original_session = app._session
+            app._session = scoped_session(
+                sessionmaker(bind=connection, join_transaction_mode="create_savepoint"),
+                scopefunc=lambda: id(app_ctx._get_current_object())
+            )
+            event.listen(connection, 'before_cursor_execute', capture)
+
+            try:
+                client = app.test_client()
+                with app.app_context():
+                    headers = {"Authorization": f"Bearer {create_access_token(identity=str(ids['user_id']))}"}
+
+                for endpoint in HOT_ENDPOINTS:
+                    url = endpoint.format(**ids)
+                    start = len(captured)
+                    response = client.get(url, headers=headers)
+                    response.get_data()
+
+                    if response.status_code != 200:
+                        raise RuntimeError(f"GET {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+                    for statement, parameters in captured[start:]:
+                        results.append({"query": f"GET {endpoint}", "statement": statement, "parameters": parameters})
+            finally:
+                event.remove(connection, 'before_cursor_execute', capture)
+                app._session = original_session
+
+            for label, query in cascade_queries(ids):
+                compiled = query.compile(connection)
+                parameters = (
+                    tuple(compiled.params[name] for name in compiled.positiontup)
+                    if compiled.positional else compiled.params
+                )
+                results.append({"query": f"FK {label}", "statement": str(compiled), "parameters": parameters})
+
+            for result in results:
+                result["plan"], result["seq_scans"] = explain(connection, result["statement"], result["parameters"])
+        finally:
+            transaction.rollback()
+
+    return results
@@ -0,0 +1,127 @@
+import atexit
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+
+# Bodies above this are never parsed for logging, only their size is reported
+MAX_PARSE_BYTES = 1024 * 1024
+
+class LazyPayload:
+    # Parsing, sanitizing and dumping only happen when the record is formatted,
+    # which is on the listener thread rather than the request thread
+    def __init__(self, data, sanitizer, max_bytes, is_json=True):
+        self.data = data
+        self.sanitizer = sanitizer
+        self.max_bytes = max_bytes
+        self.is_json = is_json
+
+    def __str__(self):
+        if isinstance(self.data, dict):
+            text = json.dumps(self.sanitizer.sanitize_dict(self.data), default=str)
+        elif not self.data:
+            text = "{}" if self.is_json else ""
+        elif len(self.data) > MAX_PARSE_BYTES:
+            return f"[{len(self.data)} bytes, not logged]"
+        elif self.is_json:
+            try:
+                text = json.dumps(self.sanitizer.sanitize_dict(json.loads(self.data)), default=str)
+            except ValueError:
+                return f"[{len(self.data)} bytes, invalid JSON]"
+        else:
+            text = self.data.decode('utf-8', errors='replace')
+
+        if len(text) > self.max_bytes:
+            return f"{text[:self.max_bytes]}... [truncated, {len(text)} chars total]"
+        return text
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock QueueHandler formats the message before enqueueing it; keep it lazy
+    def prepare(self, record):
+        return record
+
+class PayloadLogPipeline:
+    # splitit.payloads is process-wide, so only the most recently started pipeline (one
+    # per create_app()) is attached to it; starting another detaches and stops the old one
+    _active = None
+    _active_lock = Lock()
+
+    def __init__(self, sanitizer, default_rate=1.0, route_rates=None, max_bytes=4096, handler=None):
+        self.sanitizer = sanitizer
+        self.default_rate = default_rate
+        self.route_rates = route_rates or {}
+        self.max_bytes = max_bytes
+
+        self.logger = logging.getLogger('splitit.payloads')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+        if handler is None:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s'))
+
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = _DeferredQueueHandler(self.queue)
+        self.listener = QueueListener(self.queue, handler, respect_handler_level=True)
+        self.started = False
+
+    @classmethod
+    def from_env(cls, sanitizer, env):
+        # PAYLOAD_LOG_ROUTE_RATES="users.login=0,expenses.get_expenses=0.1" (endpoint=rate)
+        route_rates = {}
+        for entry in env.get('PAYLOAD_LOG_ROUTE_RATES', '').split(','):
+            if '=' in entry:
+                endpoint, rate = entry.split('=', 1)
+                route_rates[endpoint.strip()] = float(rate)
+
+        return cls(
+            sanitizer,
+            default_rate=float(env.get('PAYLOAD_LOG_SAMPLE_RATE', 1.0)),
+            route_rates=route_rates,
+            max_bytes=int(env.get('PAYLOAD_LOG_MAX_BYTES', 4096))
+        )
+
+    def start(self):
+        with PayloadLogPipeline._active_lock:
+            previous = PayloadLogPipeline._active
+            if previous is not None and previous is not self:
+                previous.stop()
+
+            self.logger.addHandler(self.queue_handler)
+            self.listener.start()
+            self.started = True
+            PayloadLogPipeline._active = self
+
+        atexit.register(self.stop)
+
+    def stop(self):
+        # Flushes whatever is still queued
+        if self.started:
+            self.logger.removeHandler(self.queue_handler)
+            self.listener.stop()
+            self.started = False
+            atexit.unregister(self.stop)
+
+    def sample(self, endpoint):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return False
+
+        rate = self.route_rates.get(endpoint, self.default_rate)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def log_request(self, method, path, query_params, body):
+        self.logger.info(
+            "\nRequest: %s %s\nQuery Params: %s\nBody: %s",
+            method, path,
+            LazyPayload(query_params, self.sanitizer, self.max_bytes),
+            LazyPayload(body, self.sanitizer, self.max_bytes)
+        )
+
+    def log_response(self, status_code, data, is_json):
+        self.logger.info(
+            "\nResponse: %s\nData: %s",
+            status_code,
+            LazyPayload(data, self.sanitizer, self.max_bytes, is_json=is_json)
+        )
@@ -1,24 +1,94 @@
+import logging
+import re
+
+REDACTED = "[REDACTED]"
+
+# ijson-style basic_parse events that open and close a container
+_START_EVENTS = ('start_map', 'start_array')
+_END_EVENTS = ('end_map', 'end_array')
+
 class SensitiveSanitizer:
-    def __init__(self, logger, sensitive_fields=[]):
+    def __init__(self, logger, sensitive_fields=[], sensitive_pattern=None):
         self.sensitive_fields = sensitive_fields
         self.logger = logger
+        # Field names are matched case-insensitively against a precompiled set,
+        # plus an optional regex for families of names (e.g. r"secret|token$")
+        self._field_set = frozenset(field.lower() for field in sensitive_fields)
+        self._field_pattern = re.compile(sensitive_pattern, re.IGNORECASE) if sensitive_pattern else None
 
-    def sanitize_dict(self, data_dict):
-        data_dict = data_dict.copy()
-
-        for field in self.sensitive_fields:
-            if field in data_dict:
-                if isinstance(data_dict[field], str):
-                    data_dict[field] = "[REDACTED]"
-                elif isinstance(data_dict[field], list):
-                    data_dict[field] = ["[REDACTED]" for _ in data_dict[field]]
-                elif isinstance(data_dict[field], dict):
-                    data_dict[field] = {k: "[REDACTED]" for k in data_dict[field].keys()}
+    def is_sensitive(self, key):
+        if not isinstance(key, str):
+            return False
+
+        lowered = key.lower()
+        return lowered in self._field_set or (self._field_pattern is not None and self._field_pattern.search(lowered) is not None)
+
+    # Walks nested dicts and lists once. Containers are only copied when something
+    # inside them changes, so clean payloads come back as the very same object.
+    def sanitize(self, value):
+        if isinstance(value, dict):
+            changed = None
+
+            for key, item in value.items():
+                if self.is_sensitive(key):
+                    new_item = REDACTED
                 else:
-                    self.logger.warning(f"Unsupported type for sensitive field '{field}': {type(data_dict[field])}")
-                    return
-                
-                self.logger.debug(f"Sensitive field '{field}' sanitized.")
-                data_dict[field] = "[REDACTED]"
-                
-        return data_dict
\ No newline at end of file
+                    new_item = self.sanitize(item)
+
+                if new_item is not item:
+                    if changed is None:
+                        changed = dict(value)
+                    changed[key] = new_item
+
+            return value if changed is None else changed
+
+        if isinstance(value, list):
+            changed = None
+
+            for index, item in enumerate(value):
+                new_item = self.sanitize(item)
+
+                if new_item is not item:
+                    if changed is None:
+                        changed = list(value)
+                    changed[index] = new_item
+
+            return value if changed is None else changed
+
+        return value
+
+    def sanitize_dict(self, data_dict):
+        sanitized = self.sanitize(data_dict)
+
+        if sanitized is not data_dict and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Sensitive fields sanitized.")
+
+        return sanitized
+
+    # Streaming variant over ijson-style (event, value) pairs, e.g. ijson.basic_parse(stream).
+    # The value of a sensitive key, scalar or whole container, becomes one string event.
+    def sanitize_events(self, events):
+        events = iter(events)
+        redact_next = False
+
+        for event, value in events:
+            if redact_next:
+                redact_next = False
+
+                if event in _START_EVENTS:
+                    depth = 1
+                    for skipped_event, _ in events:
+                        if skipped_event in _START_EVENTS:
+                            depth += 1
+                        elif skipped_event in _END_EVENTS:
+                            depth -= 1
+                            if depth == 0:
+                                break
+
+                yield 'string', REDACTED
+                continue
+
+            if event == 'map_key' and self.is_sensitive(value):
+                redact_next = True
+
+            yield event, value
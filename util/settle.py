@@ -0,0 +1,154 @@
+import heapq
+from collections import OrderedDict
+from threading import Lock
+
+# Above this many non-zero balances the exact search (O(2^n * n)) is too slow
+EXACT_MODE_LIMIT = 10
+
+def _to_cents(balances):
+    cents = {user_id: int(round(balance * 100)) for user_id, balance in balances.items()}
+    cents = {user_id: amount for user_id, amount in cents.items() if amount != 0}
+
+    # Rounding can leave a cent or two unaccounted for; give it to the largest position
+    residual = sum(cents.values())
+    if residual and cents:
+        largest = max(cents, key=lambda user_id: abs(cents[user_id]))
+        cents[largest] -= residual
+        if cents[largest] == 0:
+            del cents[largest]
+
+    return cents
+
+def _greedy(cents):
+    transfers = []
+    creditors = [(-amount, user_id) for user_id, amount in cents.items() if amount > 0]
+    debtors = [(amount, user_id) for user_id, amount in cents.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    # Always match the largest debt with the largest credit
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+
+    return transfers
+
+def greedy_transfers(cents):
+    transfers = []
+    remaining = dict(cents)
+
+    # Exact opposites settle in a single transfer, so pair them off first
+    debtors_by_amount = {}
+    for user_id, amount in cents.items():
+        if amount < 0:
+            debtors_by_amount.setdefault(-amount, []).append(user_id)
+    for user_id, amount in cents.items():
+        if amount > 0 and debtors_by_amount.get(amount):
+            debtor = debtors_by_amount[amount].pop()
+            transfers.append((debtor, user_id, amount))
+            del remaining[debtor]
+            del remaining[user_id]
+
+    return transfers + _greedy(remaining)
+
+def exact_transfers(cents):
+    users = list(cents)
+    amounts = [cents[user_id] for user_id in users]
+    n = len(users)
+    full = (1 << n) - 1
+
+    # best[mask]: most zero-sum subgroups the users in mask can be split into.
+    # Each subgroup of k users settles in k - 1 transfers, so more subgroups means fewer transfers.
+    totals = [0] * (full + 1)
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        totals[mask] = totals[mask ^ low] + amounts[low.bit_length() - 1]
+
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            best[mask] = max(best[mask], best[mask ^ bit])
+            bits ^= bit
+        if totals[mask] == 0:
+            best[mask] += 1
+
+    # Walk back from the full set, cutting a subgroup off whenever a zero-sum prefix is reached
+    subgroups = []
+    current = []
+    mask = full
+    while mask:
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if best[mask ^ bit] + (1 if totals[mask] == 0 else 0) == best[mask]:
+                break
+            bits ^= bit
+
+        if totals[mask] == 0 and current:
+            subgroups.append(current)
+            current = []
+        current.append(bit.bit_length() - 1)
+        mask ^= bit
+    if current:
+        subgroups.append(current)
+
+    transfers = []
+    for subgroup in subgroups:
+        transfers.extend(_greedy({users[index]: amounts[index] for index in subgroup}))
+    return transfers
+
+def settle_up(balances, exact_limit=EXACT_MODE_LIMIT):
+    cents = _to_cents(balances)
+
+    if len(cents) <= exact_limit:
+        mode = "exact"
+        transfers = exact_transfers(cents)
+    else:
+        mode = "greedy"
+        transfers = greedy_transfers(cents)
+
+    return {
+        "mode": mode,
+        "transfers": [
+            {"from_user_id": debtor, "to_user_id": creditor, "amount": amount / 100}
+            for debtor, creditor, amount in transfers
+        ]
+    }
+
+class SettleCache:
+    def __init__(self, max_groups=1024):
+        self.max_groups = max_groups
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, group_id, balances):
+        # Entries are only served while the balances they were computed from still match
+        fingerprint = tuple(sorted(balances.items()))
+
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(group_id)
+                return entry[1]
+
+        result = settle_up(balances)
+
+        with self._lock:
+            self._entries[group_id] = (fingerprint, result)
+            self._entries.move_to_end(group_id)
+            while len(self._entries) > self.max_groups:
+                self._entries.popitem(last=False)
+
+        return result
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._entries.pop(group_id, None)
@@ -0,0 +1,77 @@
+from sqlalchemy import select, func, extract
+from model import Expense, ExpenseSplit
+
+# Spending analytics for GET /groups/summary, aggregated by the database. The group_id
+# and date range are served by ix_expense_group_date, so only the matching expenses
+# (and their splits) are read, never the whole table.
+
+SUMMARY_GROUPINGS = ('month', 'payer', 'member')
+
+def _expense_filters(group_id, start, end):
+    filters = [Expense.group_id == group_id]
+
+    if start is not None:
+        filters.append(Expense.date >= start)
+    if end is not None:
+        filters.append(Expense.date <= end)
+
+    return filters
+
+def member_totals(session, filters):
+    rows = session.execute(
+        select(ExpenseSplit.user_id, func.sum(ExpenseSplit.amount_paid), func.sum(ExpenseSplit.amount_owed))
+        .join(Expense, Expense.id == ExpenseSplit.expense_id)
+        .where(*filters, ExpenseSplit.user_id.is_not(None))
+        .group_by(ExpenseSplit.user_id)
+        .order_by(ExpenseSplit.user_id)
+    )
+
+    return [
+        {"user_id": user_id, "paid": paid or 0.0, "owed": owed or 0.0, "net": (paid or 0.0) - (owed or 0.0)}
+        for user_id, paid, owed in rows
+    ]
+
+def spend_by_month(session, filters):
+    year = extract('year', Expense.date)
+    month = extract('month', Expense.date)
+
+    rows = session.execute(
+        select(year, month, func.sum(Expense.totalCost), func.count(Expense.id))
+        .where(*filters)
+        .group_by(year, month)
+        .order_by(year, month)
+    )
+
+    return [
+        {"period": f"{int(y):04d}-{int(m):02d}", "total": total or 0.0, "count": count}
+        for y, m, total, count in rows
+    ]
+
+def spend_by_payer(session, filters):
+    rows = session.execute(
+        select(Expense.paid_by_id, func.sum(Expense.totalCost), func.count(Expense.id))
+        .where(*filters)
+        .group_by(Expense.paid_by_id)
+        .order_by(Expense.paid_by_id)
+    )
+
+    return [{"user_id": user_id, "total": total or 0.0, "count": count} for user_id, total, count in rows]
+
+def group_summary(session, group_id, start=None, end=None, by='month'):
+    filters = _expense_filters(group_id, start, end)
+    summary = {"members": member_totals(session, filters)}
+
+    # The month and payer breakdowns already add up to the totals
+    if by == 'month':
+        summary["periods"] = breakdown = spend_by_month(session, filters)
+    elif by == 'payer':
+        summary["payers"] = breakdown = spend_by_payer(session, filters)
+    else:
+        total, count = session.execute(
+            select(func.sum(Expense.totalCost), func.count(Expense.id)).where(*filters)
+        ).one()
+        breakdown = [{"total": total or 0.0, "count": count}]
+
+    summary["total"] = sum(row["total"] for row in breakdown)
+    summary["expense_count"] = sum(row["count"] for row in breakdown)
+    return summary
@@ -0,0 +1,110 @@
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import selectinload
+from model import Group, User, Expense, ExpenseSplit, Tombstone, group_membership
+from util.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Delta sync tokens are the group version the client last saw. Writes stamp the rows
+# they touch with the group's new version (see util/group_versions.py), so "what
+# changed" is every row stamped after the token plus the tombstones recorded since.
+
+# No token means a full sync; rows written before sync tracking carry version 0
+FULL_SYNC = -1
+
+def encode_sync_token(version):
+    return encode_cursor([version])
+
+def decode_sync_token(token):
+    if not token:
+        return FULL_SYNC
+
+    version = decode_cursor(token, [Group.version])[0]
+    if not isinstance(version, int) or version < 0:
+        raise InvalidCursor(token)
+    return version
+
+def touch_members(session, group_id, user_ids, version):
+    session.execute(
+        update(group_membership)
+        .where(group_membership.c.group_id == group_id, group_membership.c.user_id.in_(user_ids))
+        .values(sync_version=version)
+    )
+
+def record_tombstones(session, group_id, version, entity, entity_ids):
+    rows = [
+        {"group_id": group_id, "entity": entity, "entity_id": entity_id, "sync_version": version}
+        for entity_id in entity_ids
+    ]
+
+    if rows:
+        session.execute(insert(Tombstone), rows)
+
+# A user's name is embedded in memberships and in the expenses they paid for or split,
+# across all their groups; each row takes its own group's (already bumped) version
+def touch_user_rows(session, user_id):
+    session.execute(
+        update(group_membership)
+        .where(group_membership.c.user_id == user_id)
+        .values(sync_version=select(Group.version).where(Group.id == group_membership.c.group_id).scalar_subquery())
+    )
+    session.execute(
+        update(Expense)
+        .where(or_(
+            Expense.paid_by_id == user_id,
+            Expense.id.in_(select(ExpenseSplit.expense_id).where(ExpenseSplit.user_id == user_id))
+        ))
+        .values(sync_version=select(Group.version).where(Group.id == Expense.group_id).scalar_subquery()),
+        execution_options={"synchronize_session": False}
+    )
+
+def changes_since(session, group, since):
+    # group.version is read first: anything committed later is either newer than the
+    # returned token or already included, so the next sync never misses a write
+    version = group.version
+
+    expenses = session.scalars(
+        select(Expense)
+        .options(
+            selectinload(Expense.paid_by),
+            selectinload(Expense.splits).selectinload(ExpenseSplit.user)
+        )
+        .where(Expense.group_id == group.id, Expense.sync_version > since)
+        .order_by(Expense.id)
+    ).all()
+
+    members = session.scalars(
+        select(User)
+        .join(group_membership, group_membership.c.user_id == User.id)
+        .where(group_membership.c.group_id == group.id, group_membership.c.sync_version > since)
+        .order_by(User.id)
+    ).all()
+
+    # A full sync replaces the client's copy, so there is nothing to delete
+    tombstones = []
+    if since != FULL_SYNC:
+        tombstones = session.execute(
+            select(Tombstone.entity, Tombstone.entity_id)
+            .where(Tombstone.group_id == group.id, Tombstone.sync_version > since)
+            .order_by(Tombstone.id)
+        ).all()
+
+    member_ids = {member.id for member in members}
+    deleted_expense_ids = sorted({entity_id for entity, entity_id in tombstones if entity == "expense"})
+    # A member removed and re-added since the token only shows up as a member
+    removed_member_ids = sorted({
+        entity_id for entity, entity_id in tombstones if entity == "member" and entity_id not in member_ids
+    })
+
+    expense_dicts = []
+    for expense in expenses:
+        expense_dict = expense.to_dict()
+        expense_dict["updated_at"] = expense.updated_at.isoformat()
+        expense_dicts.append(expense_dict)
+
+    return {
+        "group": {"id": group.id, "name": group.name, "owner_id": group.owner_id} if version > since else None,
+        "expenses": expense_dicts,
+        "deleted_expense_ids": deleted_expense_ids,
+        "members": [member.to_dict() for member in members],
+        "removed_member_ids": removed_member_ids,
+        "sync_token": encode_sync_token(version)
+    }